@@ -1,5 +1,6 @@
 import numpy as np
 from vis_gym import *
+from collectors import estimate_victory_probability as collect_victory_statistics
 
 gui_flag = False # Set to True to enable the game state visualization
 setup(GUI=gui_flag)
@@ -10,15 +11,8 @@ obs, reward, done, info = env.reset() # Reset the environment to initial configu
 #env.render() # Uncomment to print game state info
 
 def hash(obs):
-	x,y = obs['player_position']
-	h = obs['player_health']
-	g = obs['guard_in_cell']
-	if not g:
-		g = 0
-	else:
-		g = int(g[-1])
-
-	return x*(5*3*5) + y*(3*5) + h*5 + g
+	# Same as x*(5*3*5) + y*(3*5) + h*5 + g, using the env's precomputed encoding tables
+	return env.encode_observation(obs)
 
 if gui_flag:
 	refresh(obs, reward, done, info)  # Update the game screen [GUI only]
@@ -73,14 +67,29 @@ def estimate_victory_probability(num_episodes=1000):
     Returns:
     - P (numpy array): Empirically estimated probability of defeating guards 1-4.
     """
-	P = np.zeros(len(env.guards))
+	# Only per-guard fight counters and (s,a,s') counts are kept, not the episode histories
+	stats = collect_victory_statistics(env, num_episodes=num_episodes, callback=refresh if gui_flag else None)
+	P = stats.victory_probabilities()
 
-	'''
+	return P
 
-	YOUR CODE HERE
 
+def estimate_victory_probability_adaptive(half_width=0.02, confidence=0.95, max_episodes=100000):
+	"""
+    Probability estimator that stops once every guard's estimate is tight enough
 
-	'''
+    Parameters:
+    - half_width (float): Target confidence interval half-width for every guard.
+    - confidence (float): Confidence level of the intervals.
+    - max_episodes (int): Maximum number of episodes to run.
 
-	return P
+    Returns:
+    - P (numpy array): Empirically estimated probability of defeating guards 1-4.
+    - intervals (numpy array): Lower and upper interval bounds per guard, shape (4, 2).
+    - episodes (int): Number of episodes used.
+    """
+	stats = collect_victory_statistics(env, num_episodes=max_episodes, callback=refresh if gui_flag else None,
+									   half_width=half_width, confidence=confidence)
+	lower, upper = stats.victory_intervals(confidence)
 
+	return stats.victory_probabilities(), np.stack([lower, upper], axis=1), stats.num_episodes
@@ -1,6 +1,7 @@
 import pickle
 import numpy as np
 from vis_gym import *
+from qlearning import QTable, q_learning
 
 gui_flag = False # Set to True to enable the game state visualization
 setup(GUI=gui_flag)
@@ -11,15 +12,8 @@ obs, reward, done, info = env.reset() # Reset the environment to initial configu
 #env.render() # Uncomment to print game state info
 
 def hash(obs):
-	x,y = obs['player_position']
-	h = obs['player_health']
-	g = obs['guard_in_cell']
-	if not g:
-		g = 0
-	else:
-		g = int(g[-1])
-
-	return x*(5*3*5) + y*(3*5) + h*5 + g
+	# Same as x*(5*3*5) + y*(3*5) + h*5 + g, using the env's precomputed encoding tables
+	return env.encode_observation(obs)
 
 if gui_flag:
 	refresh(obs, reward, done, info)  # Update the game screen [GUI only]
@@ -70,7 +64,7 @@ Complete the function below to do the following:
 
 '''
 
-def Q_learning(num_episodes=10000, gamma=0.9, epsilon=1, decay_rate):
+def Q_learning(num_episodes=10000, gamma=0.9, epsilon=1, decay_rate=0.999, checkpoint_path=None, resume_from=None, planning_steps=0):
 	"""
 	Run Q-learning algorithm for a specified number of episodes.
 
@@ -79,22 +73,22 @@ def Q_learning(num_episodes=10000, gamma=0.9, epsilon=1, decay_rate):
     - gamma (float): Discount factor.
     - epsilon (float): Exploration rate.
     - decay_rate (float): Rate at which epsilon decays. Epsilon is decayed as epsilon = epsilon * decay_rate after each episode.
+    - checkpoint_path (str): File to write periodic training checkpoints to, e.g. 'Q_checkpoint.npz' (None = no checkpoints).
+    - resume_from (str): Checkpoint to continue an interrupted run from.
+    - planning_steps (int): Dyna mode, number of prioritized sweeping updates from the learned model per real step (0 = off), cannot be combined with resume_from.
 
     Returns:
     - Q_table (dict): Dictionary containing the Q-values for each state-action pair.
     """
-	Q_table = {}
-
-	'''
-
-	YOUR CODE HERE
-
-
-	'''
+	# Training runs on a dense (375 x 6) array-backed table, the dict is only built for saving
+	Q = q_learning(env, num_episodes=num_episodes, gamma=gamma, epsilon=epsilon, decay_rate=decay_rate,
+				   callback=refresh if gui_flag else None, checkpoint_path=checkpoint_path, resume_from=resume_from,
+				   planning_steps=planning_steps)
+	Q_table = Q.to_dict()
 
 	return Q_table
 
-decay_rate = ''' YOUR DECAY RATE HERE '''
+decay_rate = 0.999
 
 Q_table = Q_learning(num_episodes=10000, gamma=0.9, epsilon=1, decay_rate=decay_rate) # Run Q-learning
 
@@ -102,12 +96,15 @@ Q_table = Q_learning(num_episodes=10000, gamma=0.9, epsilon=1, decay_rate=decay_
 with open('Q_table.pickle', 'wb') as handle:
     pickle.dump(Q_table, handle, protocol=pickle.HIGHEST_PROTOCOL)
 
+# Same table as .npz for fast reloading with QTable.load (use checkpoint_path to also keep the visit counts)
+QTable.from_dict(Q_table, env.num_states, len(env.actions)).save('Q_table.npz', gamma=0.9, decay_rate=decay_rate, episodes=10000)
+
 
 '''
 Uncomment the code below to play an episode using the saved Q-table. Useful for debugging/visualization.
 '''
 
-# Q_table = np.load('Q_table.npy', allow_pickle=True).item()
+# Q_table = QTable.load('Q_table.npz').to_dict()  # or pickle.load(open('Q_table.pickle', 'rb'))
 
 # obs, reward, done, info = env.reset()
 # total_reward = 0
@@ -121,6 +118,11 @@ Uncomment the code below to play an episode using the saved Q-table. Useful for
 
 # print("Total reward:", total_reward)
 
+# # Batch evaluation over many episodes (win rate, returns, lengths, per-guard stats)
+# from evaluation import evaluate_policy
+# results = evaluate_policy(Q_table, num_episodes=100000)
+# print("Win rate:", results['win_rate'], "Mean return:", results['mean_return'])
+
 # # Close the
 # env.close() # Close the environment
 
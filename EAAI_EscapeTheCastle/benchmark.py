@@ -0,0 +1,298 @@
+"""
+Throughput, latency and memory benchmarks for the environment and learners.
+
+Usage:
+    python benchmark.py --output results.json
+    python benchmark.py --baseline results.json --threshold 0.15
+
+Every benchmark runs at a fixed seed and size. Results are printed and optionally written as JSON;
+with --baseline, any benchmark whose rate drops more than --threshold below the baseline is reported
+and the script exits with status 1.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+import numpy as np
+from mdp_gym import CastleEscapeEnv
+from vec_env import CastleEscapeVecEnv
+from collectors import estimate_victory_probability
+from qlearning import q_learning
+from parallel import parallel_q_learning, run_rollouts
+from evaluation import evaluate_policy
+
+
+def time_calls(fn, num_calls):
+    """Calls fn(i) num_calls times, returning (total seconds, per-call latencies in microseconds)"""
+    latencies = np.empty(num_calls)
+    clock = time.perf_counter_ns
+    start = clock()
+    for i in range(num_calls):
+        t = clock()
+        fn(i)
+        latencies[i] = clock() - t
+    return (clock() - start) / 1e9, latencies / 1e3
+
+
+def peak_memory(fn):
+    """Peak Python heap allocation in bytes while running fn(), measured with tracemalloc"""
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def per_call_result(seconds, latencies, calls, unit):
+    return {
+        'unit': unit,
+        'count': calls,
+        'seconds': seconds,
+        'rate': calls / seconds,
+        'latency_us': dict(zip(['p50', 'p90', 'p99', 'max'], np.percentile(latencies, [50, 90, 99, 100]).tolist())),
+    }
+
+
+def bench_env_step(scale):
+    env = CastleEscapeEnv(seed=0)
+    actions = np.random.default_rng(0).integers(6, size=20000 * scale).tolist()
+
+    def step(i):
+        if env.step(actions[i])[2]:
+            env.reset()
+    seconds, latencies = time_calls(step, len(actions))
+    return per_call_result(seconds, latencies, len(actions), 'steps')
+
+
+def bench_env_step_fast(scale):
+    env = CastleEscapeEnv(seed=0)
+    actions = np.random.default_rng(0).integers(6, size=50000 * scale).tolist()
+
+    def step(i):
+        if env.step_fast(actions[i])[2]:
+            env.reset()
+    seconds, latencies = time_calls(step, len(actions))
+    return per_call_result(seconds, latencies, len(actions), 'steps')
+
+
+def bench_env_reset(scale):
+    env = CastleEscapeEnv(seed=0)
+    seconds, latencies = time_calls(lambda i: env.reset(), 20000 * scale)
+    return per_call_result(seconds, latencies, 20000 * scale, 'resets')
+
+
+def bench_get_observation(scale):
+    env = CastleEscapeEnv(seed=0)
+    seconds, latencies = time_calls(lambda i: env.get_observation(), 50000 * scale)
+    return per_call_result(seconds, latencies, 50000 * scale, 'calls')
+
+
+def bench_vec_env_step(scale, num_envs=1024):
+    vec_env = CastleEscapeVecEnv(num_envs, seed=0)
+    actions = np.random.default_rng(0).integers(6, size=(200 * scale, num_envs))
+    seconds, latencies = time_calls(lambda i: vec_env.step(actions[i]), len(actions))
+    result = per_call_result(seconds, latencies, len(actions) * num_envs, 'steps')
+    result['num_envs'] = num_envs
+    return result
+
+
+def bench_parallel_rollouts(scale, num_workers=2):
+    num_episodes = 2000 * scale
+    start = time.perf_counter()
+    results = run_rollouts(num_episodes, num_workers=num_workers, seed=0)
+    seconds = time.perf_counter() - start
+    return {'unit': 'steps', 'count': int(results['lengths'].sum()), 'seconds': seconds,
+            'rate': results['lengths'].sum() / seconds, 'episodes': num_episodes, 'num_workers': num_workers}
+
+
+def bench_parallel_q_learning(scale, modes=('hogwild', 'merge')):
+    """
+    Episodes/sec of shared-memory Q-learning in each mode for 1, 2, 4, ... workers up to the CPU count.
+
+    The reported rate is the first mode's at the CPU count.
+    """
+    num_episodes = 2000 * scale
+    cpus = multiprocessing.cpu_count()
+    worker_counts = sorted({min(2 ** i, cpus) for i in range(cpus.bit_length() + 1)})
+    scaling = {}
+    for mode in modes:
+        scaling[mode] = {}
+        for num_workers in worker_counts:
+            start = time.perf_counter()
+            parallel_q_learning(num_episodes, num_workers=num_workers, seed=0, mode=mode)
+            scaling[mode][num_workers] = num_episodes / (time.perf_counter() - start)
+    # Near-linear scaling keeps the efficiency (speedup / workers) close to 1
+    rate = scaling[modes[0]][cpus]
+    return {'unit': 'episodes', 'count': num_episodes, 'seconds': num_episodes / rate, 'rate': rate,
+            'cpus': cpus, 'episodes_per_sec': scaling,
+            'speedup': {mode: {n: r / rates[1] for n, r in rates.items()} for mode, rates in scaling.items()},
+            'efficiency': {mode: {n: r / rates[1] / n for n, r in rates.items()} for mode, rates in scaling.items()}}
+
+
+def bench_victory_estimation(scale):
+    num_episodes = 1000 * scale
+    env = CastleEscapeEnv(seed=0)
+    start = time.perf_counter()
+    collector = estimate_victory_probability(env, num_episodes=num_episodes, seed=0)
+    seconds = time.perf_counter() - start
+    return {'unit': 'steps', 'count': collector.num_steps, 'seconds': seconds,
+            'rate': collector.num_steps / seconds, 'episodes': num_episodes}
+
+
+def bench_q_learning(scale):
+    num_episodes = 2000 * scale
+    env = CastleEscapeEnv(seed=0)
+    start = time.perf_counter()
+    q_table = q_learning(env, num_episodes=num_episodes, seed=0)
+    seconds = time.perf_counter() - start
+    steps = int(q_table.counts.sum())
+    return {'unit': 'steps', 'count': steps, 'seconds': seconds, 'rate': steps / seconds, 'episodes': num_episodes}
+
+
+def bench_policy_evaluation(scale):
+    num_episodes = 20000 * scale
+    policy = np.random.default_rng(0).integers(6, size=CastleEscapeEnv().num_states)
+    start = time.perf_counter()
+    results = evaluate_policy(policy, num_episodes=num_episodes, num_envs=1024, seed=0, max_steps=200)
+    seconds = time.perf_counter() - start
+    steps = int(results['lengths'].sum())
+    return {'unit': 'steps', 'count': steps, 'seconds': seconds, 'rate': steps / seconds, 'episodes': num_episodes}
+
+
+def bench_vis_gym_import(scale):
+    """Cold import time of vis_gym in a fresh interpreter, which must not load pygame"""
+    code = "import sys, time; t = time.perf_counter(); import vis_gym; print(time.perf_counter() - t, 'pygame' in sys.modules)"
+    here = os.path.dirname(os.path.abspath(__file__))
+    seconds, loads_pygame = [], False
+    for _ in range(3 * scale):
+        output = subprocess.run([sys.executable, '-c', code], cwd=here, capture_output=True, text=True, check=True)
+        elapsed, loaded = output.stdout.split()[-2:]
+        seconds.append(float(elapsed))
+        loads_pygame |= loaded == 'True'
+    return {'unit': 'imports', 'count': len(seconds), 'seconds': min(seconds), 'rate': 1 / min(seconds),
+            'import_seconds': min(seconds), 'loads_pygame': loads_pygame}
+
+
+BENCHMARKS = {
+    'env_step': bench_env_step,
+    'env_step_fast': bench_env_step_fast,
+    'env_reset': bench_env_reset,
+    'env_get_observation': bench_get_observation,
+    'vec_env_step': bench_vec_env_step,
+    'parallel_rollouts': bench_parallel_rollouts,
+    'parallel_q_learning': bench_parallel_q_learning,
+    'victory_estimation': bench_victory_estimation,
+    'q_learning': bench_q_learning,
+    'policy_evaluation': bench_policy_evaluation,
+    'vis_gym_import': bench_vis_gym_import,
+}
+
+
+def run_benchmarks(names=None, scale=1, repeat=3, memory=True):
+    """
+    Runs the selected benchmarks, keeping the fastest of repeat runs.
+
+    Parameters:
+    - names (list of str): Benchmarks to run, all of BENCHMARKS when None.
+    - scale (int): Multiplier for the number of calls/episodes of every benchmark.
+    - repeat (int): Number of timed runs per benchmark.
+    - memory (bool): Also measure peak memory, in an extra untimed run under tracemalloc.
+
+    Returns:
+    - results (dict): Benchmark name -> result dict with at least 'rate' and 'seconds'.
+    """
+    results = {}
+    for name in names or BENCHMARKS:
+        bench = BENCHMARKS[name]
+        result = max((bench(scale) for _ in range(repeat)), key=lambda r: r['rate'])
+        if memory:
+            result['peak_memory_bytes'] = peak_memory(lambda: bench(scale))
+        results[name] = result
+    return results
+
+
+def compare(results, baseline, threshold=0.1):
+    """
+    Compares rates against a baseline.
+
+    Returns:
+    - regressions (dict): Benchmark name -> (baseline rate, current rate, relative change) for every
+      benchmark slower than the baseline by more than threshold.
+    """
+    regressions = {}
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        base_rate = baseline[name]['rate']
+        change = result['rate'] / base_rate - 1
+        if change < -threshold:
+            regressions[name] = (base_rate, result['rate'], change)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    parser.add_argument('--baseline', help='JSON results to compare against')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='Allowed relative slowdown before a benchmark counts as a regression')
+    parser.add_argument('--only', nargs='+', choices=sorted(BENCHMARKS), help='Benchmarks to run')
+    parser.add_argument('--scale', type=int, default=1, help='Multiplier for the benchmark sizes')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs per benchmark, the fastest is kept')
+    parser.add_argument('--no-memory', action='store_true', help='Skip the peak memory measurement')
+    parser.add_argument('--max-import-seconds', type=float, default=0.5,
+                        help='Startup target: fail when importing vis_gym takes longer than this')
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.only, scale=args.scale, repeat=args.repeat, memory=not args.no_memory)
+    for name, result in results.items():
+        line = f"{name:22s} {result['rate']:14,.0f} {result['unit']}/s"
+        if 'latency_us' in result:
+            latency = result['latency_us']
+            line += f"  p50 {latency['p50']:8.2f}us  p99 {latency['p99']:8.2f}us"
+        for mode, speedups in result.get('speedup', {}).items():
+            line += f'  {mode} speedup ' + ' '.join(f"{n}w:{speedup:.2f}x" for n, speedup in speedups.items())
+        if 'peak_memory_bytes' in result:
+            line += f"  peak {result['peak_memory_bytes'] / 2**20:8.2f}MiB"
+        print(line)
+
+    if args.output:
+        report = {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'scale': args.scale,
+            'benchmarks': results,
+        }
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    status = 0
+    if 'vis_gym_import' in results:
+        result = results['vis_gym_import']
+        if result['loads_pygame']:
+            print("FAILED vis_gym_import: importing vis_gym loaded pygame")
+            status = 1
+        if result['import_seconds'] > args.max_import_seconds:
+            print(f"FAILED vis_gym_import: {result['import_seconds']:.3f}s above the {args.max_import_seconds}s target")
+            status = 1
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['benchmarks']
+        regressions = compare(results, baseline, args.threshold)
+        for name, (base_rate, rate, change) in regressions.items():
+            print(f"REGRESSION {name}: {rate:,.0f} vs baseline {base_rate:,.0f} ({change:+.1%})")
+        if regressions:
+            status = 1
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,150 @@
+from statistics import NormalDist
+import numpy as np
+from solvers import model_from_counts
+
+
+class TransitionCollector:
+    """Streaming sufficient statistics of env.step results over the hashed state space"""
+
+    def __init__(self, env):
+        self.num_states = env.num_states
+        self.num_actions = len(env.actions)
+        self.num_guards = len(env.guards)
+        self.num_health = len(env.health_states)
+        self.fight_action = env.actions.index('FIGHT')
+
+        # Fight outcomes per guard (index 0 is G1)
+        self.fights = np.zeros(self.num_guards, dtype=np.int64)
+        self.wins = np.zeros(self.num_guards, dtype=np.int64)
+        # Transition counts keyed by (s * num_actions + a) * num_states + s', so memory grows with the
+        # number of distinct transitions seen instead of S*A*S, and the summed reward of every (s, a)
+        self.transition_counts = {}
+        self.reward_sums = np.zeros((self.num_states, self.num_actions))
+        self.num_steps = 0
+        self.num_episodes = 0
+
+    def decode(self, state):
+        """Returns the (health, guard_in_cell index) encoded in a hashed state"""
+        rest, guard = divmod(state, self.num_guards + 1)
+        return rest % self.num_health, guard
+
+    def update(self, state, action, reward, next_state, done):
+        """Records one transition between hashed states"""
+        key = (state * self.num_actions + action) * self.num_states + next_state
+        self.transition_counts[key] = self.transition_counts.get(key, 0) + 1
+        self.reward_sums[state, action] += reward
+        self.num_steps += 1
+        if done:
+            self.num_episodes += 1
+
+        if action == self.fight_action:
+            health, guard = self.decode(state)
+            if guard:
+                # A lost fight always costs one health level, a won fight leaves it unchanged
+                self.fights[guard - 1] += 1
+                if self.decode(next_state)[0] == health:
+                    self.wins[guard - 1] += 1
+
+    def merge(self, other):
+        """Adds the statistics of another collector over the same state space"""
+        self.fights += other.fights
+        self.wins += other.wins
+        for key, count in other.transition_counts.items():
+            self.transition_counts[key] = self.transition_counts.get(key, 0) + count
+        self.reward_sums += other.reward_sums
+        self.num_steps += other.num_steps
+        self.num_episodes += other.num_episodes
+        return self
+
+    def victory_probabilities(self):
+        """Returns the empirical probability of defeating each guard (0 for guards never fought)"""
+        return np.divide(self.wins, self.fights, out=np.zeros(self.num_guards), where=self.fights > 0)
+
+    def victory_intervals(self, confidence=0.95):
+        """
+        Wilson score confidence intervals for the per-guard victory probabilities.
+
+        Returns:
+        - lower, upper (numpy arrays): Interval bounds, [0, 1] for guards never fought.
+        """
+        z = NormalDist().inv_cdf(0.5 + confidence / 2)
+        n = np.maximum(self.fights, 1)
+        p = self.wins / n
+        center = (p + z * z / (2 * n)) / (1 + z * z / n)
+        half_width = z * np.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / (1 + z * z / n)
+        unseen = self.fights == 0
+        lower = np.where(unseen, 0.0, center - half_width)
+        upper = np.where(unseen, 1.0, center + half_width)
+        return lower, upper
+
+    def counts_matrix(self, sparse=False):
+        """
+        Returns the transition counts as a dense counts[s, a, s'] array, or with sparse=True as a
+        scipy.sparse CSR matrix of shape (S*A, S) with row s*A + a.
+        """
+        keys = np.fromiter(self.transition_counts.keys(), dtype=np.int64, count=len(self.transition_counts))
+        values = np.fromiter(self.transition_counts.values(), dtype=np.int64, count=len(self.transition_counts))
+        rows, cols = np.divmod(keys, self.num_states)
+        if sparse:
+            from scipy.sparse import csr_matrix  # Only needed for the sparse model
+            return csr_matrix((values, (rows, cols)), shape=(self.num_states * self.num_actions, self.num_states))
+        counts = np.zeros((self.num_states * self.num_actions, self.num_states), dtype=np.int64)
+        counts[rows, cols] = values
+        return counts.reshape(self.num_states, self.num_actions, self.num_states)
+
+    @property
+    def counts(self):
+        """Dense counts[s, a, s'] array, only practical for small layouts"""
+        return self.counts_matrix()
+
+    def transition_model(self, sparse=False):
+        """Returns the estimated (P, R) model, see solvers.model_from_counts"""
+        return model_from_counts(self.counts_matrix(sparse), self.reward_sums)
+
+
+def estimate_victory_probability(env, num_episodes=1000, seed=None, collector=None, callback=None,
+                                 half_width=None, confidence=0.95, check_every=100):
+    """
+    Plays episodes that always fight when a guard is present and otherwise move randomly,
+    streaming every step into a TransitionCollector.
+
+    When half_width is given the run stops early, as soon as the confidence interval of every
+    guard is at most half_width wide on each side; num_episodes is then the maximum budget.
+    The episodes actually used are available as collector.num_episodes.
+
+    Parameters:
+    - env (CastleEscapeEnv): Environment to play on.
+    - num_episodes (int): Number of episodes to run (maximum number when half_width is set).
+    - seed (int): Seed for the random movement.
+    - collector (TransitionCollector): Collector to keep adding to, a new one is created when None.
+    - callback (callable): Called as callback(obs, reward, done, info) after every step, e.g. vis_gym.refresh.
+    - half_width (float): Target confidence interval half-width per guard, None to run all episodes.
+    - confidence (float): Confidence level of the intervals.
+    - check_every (int): Number of episodes between stopping checks.
+
+    Returns:
+    - collector (TransitionCollector): The accumulated statistics.
+    """
+    rng = np.random.default_rng(seed)
+    if collector is None:
+        collector = TransitionCollector(env)
+    fight = env.actions.index('FIGHT')
+
+    for episode in range(num_episodes):
+        if half_width is not None and episode % check_every == 0:
+            lower, upper = collector.victory_intervals(confidence)
+            if np.all(upper - lower <= 2 * half_width):
+                break
+
+        env.reset()
+        state = env.get_state_hash()
+        done = False
+        while not done:
+            action = fight if collector.decode(state)[1] else int(rng.integers(4))
+            next_state, reward, done = env.step_fast(action)
+            collector.update(state, action, reward, next_state, done)
+            if callback is not None:
+                callback(*env.last_step_result())
+            state = next_state
+
+    return collector
@@ -0,0 +1,138 @@
+import numpy as np
+from mdp_gym import CastleEscapeEnv
+from qlearning import QTable
+from vec_env import CastleEscapeVecEnv
+
+
+def compile_policy(policy, num_states):
+    """
+    Turns a Q-table or policy into a state -> action lookup array.
+
+    Parameters:
+    - policy: A QTable, a {state: {action: q}} dict as produced by MFMC.py (states missing from the
+      dict play action 0), a (num_states, num_actions) Q-value array, or a policy array.
+    - num_states (int): Size of the hashed state space.
+
+    Returns:
+    - actions (numpy array): Greedy action for every hashed state.
+    """
+    if isinstance(policy, QTable):
+        return policy.to_policy()
+    if isinstance(policy, dict):
+        actions = np.zeros(num_states, dtype=np.int64)
+        for state, q_values in policy.items():
+            if q_values:
+                actions[state] = max(q_values, key=q_values.get)
+        return actions
+    policy = np.asarray(policy)
+    if policy.ndim == 2:
+        return policy.argmax(axis=1)
+    return policy.astype(np.int64)
+
+
+def evaluate_policy(policy, num_episodes=100000, num_envs=4096, seed=None, env=None, max_steps=1000,
+                    percentiles=(5, 25, 50, 75, 95)):
+    """
+    Plays a fixed policy for many episodes in lockstep on a CastleEscapeVecEnv.
+
+    Every batch slot plays a fixed share of the episodes, so short episodes are not over-represented.
+    Episodes still running after max_steps steps are cut off and counted as truncated.
+
+    Parameters:
+    - policy: Anything accepted by compile_policy.
+    - num_episodes (int): Number of episodes to play.
+    - num_envs (int): Number of episodes played in parallel.
+    - seed (int): Seed for the vectorized env.
+    - env (CastleEscapeEnv): Env providing the layout, the default castle when None.
+    - max_steps (int): Step limit per episode.
+    - percentiles (tuple): Percentiles reported for returns and episode lengths.
+
+    Returns:
+    - results (dict): 'win_rate', 'defeat_rate', 'truncation_rate', 'mean_return', 'return_percentiles',
+      'mean_length', 'length_percentiles', per-guard 'guards' stats (encounters, i.e. times the player
+      entered the guard's room, fights, hides and health lost in the guard's room) and the per-episode
+      'returns', 'lengths' and 'wins' arrays.
+    """
+    env = env if env is not None else CastleEscapeEnv()
+    num_envs = max(1, min(num_envs, num_episodes))
+    vec_env = CastleEscapeVecEnv(num_envs, env=env, seed=seed)
+    actions = compile_policy(policy, vec_env.num_states)
+    num_guards, num_health = vec_env.num_guards, vec_env.num_health
+    fight, hide = env.actions.index('FIGHT'), env.actions.index('HIDE')
+
+    # Episodes of slot i are stored at offsets[i], offsets[i] + 1, ...
+    quotas = np.array([len(chunk) for chunk in np.array_split(np.arange(num_episodes), num_envs)])
+    offsets = np.concatenate(([0], np.cumsum(quotas)[:-1]))
+    finished = np.zeros(num_envs, dtype=np.int64)
+    active = quotas > 0
+
+    returns = np.zeros(num_episodes)
+    lengths = np.zeros(num_episodes, dtype=np.int64)
+    wins = np.zeros(num_episodes, dtype=bool)
+    truncations = np.zeros(num_episodes, dtype=bool)
+    encounters = np.zeros(num_guards + 1, dtype=np.int64)
+    fights = np.zeros(num_guards + 1, dtype=np.int64)
+    hides = np.zeros(num_guards + 1, dtype=np.int64)
+    health_lost = np.zeros(num_guards + 1, dtype=np.int64)
+
+    episode_return = np.zeros(num_envs)
+    episode_length = np.zeros(num_envs, dtype=np.int64)
+    # Guard met in the previous step, so that staying in a guard's room is not a new encounter
+    previous_guard = np.zeros(num_envs, dtype=np.int64)
+    states = vec_env.reset()
+    while active.any():
+        action = actions[states]
+        guard = np.where(active, states % (num_guards + 1), 0)
+        health = vec_env.health.copy()
+        states, rewards, dones, info = vec_env.step(action)
+        episode_return += rewards
+        episode_length += 1
+
+        final_states = info['final_states']
+        encounters += np.bincount(guard[guard != previous_guard], minlength=num_guards + 1)
+        previous_guard = guard
+        fights += np.bincount(guard[action == fight], minlength=num_guards + 1)
+        hides += np.bincount(guard[action == hide], minlength=num_guards + 1)
+        lost = (final_states // (num_guards + 1)) % num_health < health
+        health_lost += np.bincount(guard[lost], minlength=num_guards + 1)
+
+        truncated = ~dones & (episode_length >= max_steps)
+        ended = dones | truncated
+        recorded = np.flatnonzero(ended & active)
+        if len(recorded):
+            slots = offsets[recorded] + finished[recorded]
+            returns[slots] = episode_return[recorded]
+            lengths[slots] = episode_length[recorded]
+            wins[slots] = dones[recorded] & (final_states[recorded] // (num_health * (num_guards + 1)) == vec_env.goal_cell)
+            truncations[slots] = truncated[recorded]
+            finished[recorded] += 1
+            active &= finished < quotas
+        if truncated.any():
+            vec_env.truncate(np.flatnonzero(truncated))
+            states = vec_env.get_states()
+        episode_return[ended] = 0
+        episode_length[ended] = 0
+        previous_guard[ended] = 0
+
+    return {
+        'episodes': num_episodes,
+        'win_rate': float(wins.mean()),
+        'defeat_rate': float((~wins & ~truncations).mean()),
+        'truncation_rate': float(truncations.mean()),
+        'mean_return': float(returns.mean()),
+        'return_percentiles': dict(zip(percentiles, np.percentile(returns, percentiles).tolist())),
+        'mean_length': float(lengths.mean()),
+        'length_percentiles': dict(zip(percentiles, np.percentile(lengths, percentiles).tolist())),
+        'guards': {
+            name: {
+                'encounters': int(encounters[i + 1]),
+                'fights': int(fights[i + 1]),
+                'hides': int(hides[i + 1]),
+                'health_lost': int(health_lost[i + 1]),
+            }
+            for i, name in enumerate(env.guard_names)
+        },
+        'returns': returns,
+        'lengths': lengths,
+        'wins': wins,
+    }
@@ -0,0 +1,100 @@
+from collections import deque
+import numpy as np
+
+
+DEFAULT_GUARDS = {
+    'G1': {'strength': 0.8, 'keenness': 0.1},  # Guard 1
+    'G2': {'strength': 0.6, 'keenness': 0.3},  # Guard 2
+    'G3': {'strength': 0.9, 'keenness': 0.2},  # Guard 3
+    'G4': {'strength': 0.7, 'keenness': 0.5},  # Guard 4
+}
+
+DEFAULT_REWARDS = {
+    'goal': 10000,
+    'combat_win': 10,
+    'combat_loss': -1000,
+    'defeat': -1000
+}
+
+
+class CastleLayout:
+    """Castle configuration shared by the env, the legacy MDP and the visualizations"""
+
+    def __init__(self, rows=5, cols=5, walls=(), guards=None, start=(0, 0), goal=None, rewards=None):
+        """
+        Parameters:
+        - rows, cols (int): Grid dimensions, rooms are numbered from (0,0) to (rows-1, cols-1).
+        - walls (iterable of tuples): Impassable rooms.
+        - guards (dict): Guard name -> {'strength': float, 'keenness': float}, defaults to the 4 standard guards.
+        - start (tuple): Room the player starts in.
+        - goal (tuple): Goal room, defaults to the bottom-right room.
+        - rewards (dict): Reward table with 'goal', 'combat_win', 'combat_loss' and 'defeat' entries.
+        """
+        self.rows = rows
+        self.cols = cols
+        self.walls = frozenset(walls)
+        self.guards = dict(DEFAULT_GUARDS if guards is None else guards)
+        self.start = start
+        self.goal = (rows - 1, cols - 1) if goal is None else goal
+        self.rewards = dict(DEFAULT_REWARDS if rewards is None else rewards)
+
+        # All rooms in row-major order, the ones that can be entered, and the ones guards are placed in
+        self.rooms = [(i, j) for i in range(rows) for j in range(cols)]
+        self.open_rooms = frozenset(room for room in self.rooms if room not in self.walls)
+        self.guard_rooms = [
+            room for room in self.rooms
+            if room in self.open_rooms and room != self.start and room != self.goal
+        ]
+
+        if self.start not in self.open_rooms or self.goal not in self.open_rooms:
+            raise ValueError("Start and goal rooms must be inside the grid and not walls")
+        if len(self.guard_rooms) < len(self.guards):
+            raise ValueError(f"Only {len(self.guard_rooms)} rooms available for {len(self.guards)} guards")
+
+    @property
+    def num_cells(self):
+        return self.rows * self.cols
+
+    def neighbors(self, room):
+        """Open rooms adjacent to room, in UP, DOWN, LEFT, RIGHT order"""
+        x, y = room
+        return [pos for pos in [(x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1)] if pos in self.open_rooms]
+
+    def goal_reachable(self):
+        """Checks that the goal can be reached from the start, ignoring guards"""
+        seen = {self.start}
+        queue = deque([self.start])
+        while queue:
+            room = queue.popleft()
+            if room == self.goal:
+                return True
+            for pos in self.neighbors(room):
+                if pos not in seen:
+                    seen.add(pos)
+                    queue.append(pos)
+        return False
+
+    @classmethod
+    def random(cls, rows, cols, num_guards=4, wall_density=0.0, seed=None, rewards=None):
+        """
+        Generates a castle with random walls and guards, used to stress-test planners and learners.
+
+        Guard strength and keenness are drawn uniformly from [0.1, 0.9]. Walls are re-drawn until the
+        goal is reachable from the start.
+        """
+        rng = np.random.default_rng(seed)
+        guards = {
+            f'G{i + 1}': {'strength': float(rng.uniform(0.1, 0.9)), 'keenness': float(rng.uniform(0.1, 0.9))}
+            for i in range(num_guards)
+        }
+        start, goal = (0, 0), (rows - 1, cols - 1)
+        while True:
+            blocked = rng.random((rows, cols)) < wall_density
+            walls = [
+                (i, j) for i, j in zip(*np.nonzero(blocked))
+                if (i, j) != start and (i, j) != goal
+            ]
+            layout = cls(rows, cols, walls=[(int(i), int(j)) for i, j in walls], guards=guards,
+                         start=start, goal=goal, rewards=rewards)
+            if layout.goal_reachable():
+                return layout
@@ -1,33 +1,28 @@
 import random
+from layout import CastleLayout
 
 class CastleEscapeMDP:
-    def __init__(self):
-        # Define a 5x5 grid (numbered from (0,0) to (4,4))
-        self.grid_size = 5
-        self.rooms = [(i, j) for i in range(self.grid_size) for j in range(self.grid_size)]
-        self.goal_room = (4, 4)  # Define the goal room
+    def __init__(self, layout=None):
+        # Castle layout, by default a 5x5 grid (numbered from (0,0) to (4,4)) with 4 guards
+        self.layout = layout if layout is not None else CastleLayout()
+        self.grid_size = max(self.layout.rows, self.layout.cols)
+        self.rooms = self.layout.rooms
+        self.goal_room = self.layout.goal  # Define the goal room
         
         # Define health states
         self.health_states = ['Full', 'Injured', 'Critical']
         
         # Define the guards with their strengths (affects combat) and keenness (affects hiding)
-        self.guards = {
-            'G1': {'strength': 0.8, 'keenness': 0.1},  # Guard 1
-            'G2': {'strength': 0.6, 'keenness': 0.3},  # Guard 2
-            'G3': {'strength': 0.9, 'keenness': 0.2},  # Guard 3
-            'G4': {'strength': 0.7, 'keenness': 0.5},  # Guard 4
-        }
+        self.guards = self.layout.guards
         
         # Set initial state
         self.current_state = {
-        'player_position': (0, 0),
+        'player_position': self.layout.start,
         'player_health': 'Full',
         'guard_positions': {}
         }
-        # Exclude the starting position (0,0) and the goal room (4,4)
-        available_rooms = self.rooms.copy()
-        available_rooms.remove((0, 0))
-        available_rooms.remove(self.goal_room)
+        # Exclude the starting position, the goal room and walls
+        available_rooms = list(self.layout.guard_rooms)
         random.shuffle(available_rooms)
         
         # Assign unique rooms to each guard
@@ -35,19 +30,14 @@ class CastleEscapeMDP:
             self.current_state['guard_positions'][guard] = available_rooms.pop()
 
         # Rewards
-        self.rewards = {
-            'goal': 10000,
-            'combat_win': 10,
-            'combat_loss': -1000,
-            'defeat': -1000
-        }
+        self.rewards = self.layout.rewards
     
     def reset(self):
         """ Resets the game to the initial state """
         self.current_state = {
-            'player_position': (0, 0),
+            'player_position': self.layout.start,
             'player_health': 'Full',
-            'guard_positions': {guard: random.choice(self.rooms[:-1]) for guard in self.guards}  # Guards in random rooms (not the goal)
+            'guard_positions': {guard: random.choice([room for room in self.rooms if room in self.layout.open_rooms and room != self.goal_room]) for guard in self.guards}  # Guards in random rooms (not the goal)
         }
     
     def is_terminal(self):
@@ -79,14 +69,14 @@ class CastleEscapeMDP:
         new_position = directions.get(action, self.current_state['player_position'])
         
         # Ensure new position is within bounds
-        if 0 <= new_position[0] < self.grid_size and 0 <= new_position[1] < self.grid_size:
+        if new_position in self.layout.open_rooms:
             # 90% chance to move as intended
             if random.random() <= 0.9:
                 self.current_state['player_position'] = new_position
             else:
                 # 10% chance to move to a random adjacent cell
                 adjacent_positions = [directions[act] for act in directions if act != action]
-                adjacent_positions = [pos for pos in adjacent_positions if 0 <= pos[0] < self.grid_size and 0 <= pos[1] < self.grid_size]
+                adjacent_positions = [pos for pos in adjacent_positions if pos in self.layout.open_rooms]
                 if adjacent_positions:
                     self.current_state['player_position'] = random.choice(adjacent_positions)
         # No movement if out of bounds
@@ -100,7 +90,7 @@ class CastleEscapeMDP:
         directions = [(x-1, y), (x+1, y), (x, y-1), (x, y+1)]
         
         # Filter out-of-bounds positions
-        adjacent_positions = [pos for pos in directions if 0 <= pos[0] < self.grid_size and 0 <= pos[1] < self.grid_size]
+        adjacent_positions = [pos for pos in directions if pos in self.layout.open_rooms]
         
         # Move player to a random adjacent position
         if adjacent_positions:
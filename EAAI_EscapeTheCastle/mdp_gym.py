@@ -1,17 +1,145 @@
+from collections.abc import MutableMapping
+from typing import NamedTuple
 import gym
 from gym import spaces
 import numpy as np
-import random
+from layout import CastleLayout
+
+# Turn outcomes, turned into result messages only when they are read
+BLOCKED, MOVED, OUT_OF_BOUNDS, FIGHT_WON, FIGHT_LOST, NO_GUARD_TO_FIGHT, HID, NO_GUARD_TO_HIDE, INVALID_ACTION = range(9)
+RESULT_MESSAGES = {
+    BLOCKED: "Guard {guard} is in the room! You must fight or hide.",
+    MOVED: "Moved to {position}",
+    OUT_OF_BOUNDS: "Out of bounds!",
+    FIGHT_WON: "Fought {guard} and won!",
+    FIGHT_LOST: "Fought {guard} and lost!",
+    NO_GUARD_TO_FIGHT: "No guard to fight!",
+    HID: "Successfully hid from {guard}!",
+    NO_GUARD_TO_HIDE: "No guard to hide from!",
+    INVALID_ACTION: "Invalid action!",
+}
+
+class CastleState(NamedTuple):
+    """Immutable, hashable game state: player room, health int (2 = Full, 1 = Injured, 0 = Critical) and guard rooms"""
+    player_position: tuple
+    player_health: int
+    guard_positions: tuple  # Rooms, ordered like CastleEscapeEnv.guard_names
+
+
+class GuardPositionsView(MutableMapping):
+    """Guard name -> room mapping that reads from and writes to the env's guard_positions"""
+
+    def __init__(self, env):
+        self.env = env
+
+    def __getitem__(self, guard):
+        return self.env.guard_positions[self.env.guard_names.index(guard)]
+
+    def __setitem__(self, guard, room):
+        positions = list(self.env.guard_positions)
+        positions[self.env.guard_names.index(guard)] = room
+        self.env.guard_positions = tuple(positions)
+        self.env.update_occupancy()
+
+    def __delitem__(self, guard):
+        raise TypeError("Guards cannot be removed")
+
+    def __iter__(self):
+        return iter(self.env.guard_names)
+
+    def __len__(self):
+        return len(self.env.guard_names)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class CurrentStateView(MutableMapping):
+    """The original current_state dict format as a live view: writes go straight into the env"""
+    KEYS = ('player_position', 'player_health', 'guard_positions')
+
+    def __init__(self, env):
+        self.env = env
+
+    def __getitem__(self, key):
+        env = self.env
+        if key == 'player_position':
+            return env.player_position
+        if key == 'player_health':
+            return env.int_to_health_state[env.player_health]
+        if key == 'guard_positions':
+            return GuardPositionsView(env)
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        env = self.env
+        if key == 'player_position':
+            env.player_position = value
+        elif key == 'player_health':
+            env.player_health = env.health_state_to_int[value]
+        elif key == 'guard_positions':
+            env.guard_positions = tuple(value[guard] for guard in env.guard_names)
+            env.update_occupancy()
+        else:
+            raise KeyError(key)
 
-class CastleEscapeEnv(gym.Env):
-    metadata = {'render.modes': ['human']}
+    def __delitem__(self, key):
+        raise TypeError("current_state keys cannot be removed")
+
+    def __iter__(self):
+        return iter(self.KEYS)
+
+    def __len__(self):
+        return len(self.KEYS)
+
+    def __repr__(self):
+        return repr({key: (dict(value) if key == 'guard_positions' else value) for key, value in self.items()})
+
+class GuardInCellSpace(spaces.Space):
+    """Space of the guard_in_cell observation: None or one of the guard names"""
+
+    def __init__(self, guard_names, seed=None):
+        self.guard_names = tuple(guard_names)
+        super().__init__(seed=seed)
+
+    def sample(self, mask=None):
+        i = int(self.np_random.integers(len(self.guard_names) + 1))
+        return self.guard_names[i - 1] if i else None
+
+    def contains(self, x):
+        return x is None or x in self.guard_names
 
-    def __init__(self):
+    def __repr__(self):
+        return f"GuardInCellSpace({self.guard_names})"
+
+    def __eq__(self, other):
+        return isinstance(other, GuardInCellSpace) and self.guard_names == other.guard_names
+
+
+class CastleEscapeEnv(gym.Env):
+    metadata = {'render.modes': ['human', 'rgb_array']}
+
+    # Offscreen rendering: pixels per room and colors, matching vis_gym
+    render_cell_size = 32
+    render_colors = {
+        'background': (255, 255, 255),
+        'grid': (0, 0, 0),
+        'wall': (90, 90, 90),
+        'goal': (255, 255, 0),
+        'guard': (255, 0, 0),
+        'player': (0, 255, 0),
+        'health': (0, 0, 255),
+        'console': (200, 200, 200),
+    }
+
+    def __init__(self, seed=None, rng_block_size=0, flat_obs=False, layout=None):
         super(CastleEscapeEnv, self).__init__()
-        # Define a 5x5 grid (numbered from (0,0) to (4,4))
-        self.grid_size = 5
-        self.rooms = [(i, j) for i in range(self.grid_size) for j in range(self.grid_size)]
-        self.goal_room = (4, 4)  # Define the goal room
+        # Castle layout, by default a 5x5 grid (numbered from (0,0) to (4,4)) with 4 guards
+        self.layout = layout if layout is not None else CastleLayout()
+        self.rows, self.cols = self.layout.rows, self.layout.cols
+        self.grid_size = max(self.rows, self.cols)
+        self.rooms = self.layout.rooms
+        self.goal_room = self.layout.goal  # Define the goal room
 
         # Define health states
         self.health_states = ['Full', 'Injured', 'Critical']
@@ -19,91 +147,331 @@ class CastleEscapeEnv(gym.Env):
         self.int_to_health_state = {2: 'Full', 1: 'Injured', 0: 'Critical'}
 
         # Define the guards with their strengths (affects combat) and keenness (affects hiding)
-        self.guards = {
-            'G1': {'strength': 0.8, 'keenness': 0.1},  # Guard 1
-            'G2': {'strength': 0.6, 'keenness': 0.3},  # Guard 2
-            'G3': {'strength': 0.9, 'keenness': 0.2},  # Guard 3
-            'G4': {'strength': 0.7, 'keenness': 0.5},  # Guard 4
-        }
+        self.guards = self.layout.guards
         self.guard_names = list(self.guards.keys())
 
         # Rewards
-        self.rewards = {
-            'goal': 10000,
-            'combat_win': 10,
-            'combat_loss': -1000,
-            'defeat': -1000
-        }
+        self.rewards = self.layout.rewards
 
         # Actions
         self.actions = ['UP', 'DOWN', 'LEFT', 'RIGHT', 'FIGHT', 'HIDE']
         self.action_space = spaces.Discrete(len(self.actions))
 
-        # Observation space
+        # Observation space, matching get_observation(): guard positions are not observed, only
+        # the guard in the player's room (None when there is none)
         obs_space_dict = {
-            'player_position': spaces.Tuple((spaces.Discrete(self.grid_size), spaces.Discrete(self.grid_size))),
+            'player_position': spaces.Tuple((spaces.Discrete(self.rows), spaces.Discrete(self.cols))),
             'player_health': spaces.Discrete(len(self.health_states)),
-            'guard_positions': spaces.Dict({
-                guard: spaces.Tuple((spaces.Discrete(self.grid_size), spaces.Discrete(self.grid_size)))
-                for guard in self.guards
-            })
+            'guard_in_cell': GuardInCellSpace(self.guard_names),
         }
         self.observation_space = spaces.Dict(obs_space_dict)
 
+        # State hashing: x*(5*3*5) + y*(3*5) + h*5 + g as in MBMC.py/MFMC.py, generalised to the
+        # layout size and guard count. Encode offsets and decode tables are precomputed once.
+        num_guard_codes = len(self.guards) + 1
+        self.num_states = self.rows * self.cols * len(self.health_states) * num_guard_codes
+        self.room_offset = {
+            room: (room[0] * self.cols + room[1]) * len(self.health_states) * num_guard_codes
+            for room in self.rooms
+        }
+        self.health_offset = [h * num_guard_codes for h in range(len(self.health_states))]
+        self.guard_code = {None: 0}
+        self.guard_code.update({guard: i + 1 for i, guard in enumerate(self.guard_names)})
+        # state_table[s] = (position, health int, guard name or None)
+        self.state_table = [
+            (room, h, guard)
+            for room in self.rooms
+            for h in range(len(self.health_states))
+            for guard in [None] + self.guard_names
+        ]
+        self.terminal_states = np.array(
+            [room == self.goal_room or h == 0 for room, h, _ in self.state_table]
+        )
+
+        # With flat_obs the hashed state is returned directly as a Discrete observation
+        self.flat_obs = flat_obs
+        if flat_obs:
+            self.observation_space = spaces.Discrete(self.num_states)
+
+        # Single random generator for all game randomness, optionally drawn in blocks of
+        # rng_block_size numbers to avoid one generator call per random event
+        self.rng_block_size = rng_block_size
+        self.seed_rng(seed)
+
         # Set initial state
+        self.guard_positions = None
         self.reset()
 
-    def reset(self):
-        """Resets the game to the initial state"""
-        #print(self.rooms[1:-1])
-        rnd_indices = np.random.choice(range(1,len(self.rooms)-1), size=len(self.guards), replace=False)
-        guard_pos = [self.rooms[i] for i in rnd_indices]
-        self.current_state = {
-            'player_position': (0, 0),
-            'player_health': 'Full',
-            'guard_positions': {
-                guard: pos for guard, pos in zip(self.guard_names, guard_pos)
-            }  # Guards in random rooms (not the goal or the starting)
+    def seed_rng(self, seed=None):
+        """Re-creates the env's numpy.random.Generator from the given seed"""
+        self.np_random = np.random.default_rng(seed)
+        self.action_space.seed(int(self.np_random.integers(2**31)))
+        self._rng_block = []
+        self._rng_pos = 0
+
+    def get_rng_state(self):
+        """Snapshots the env's generator, including unused buffered draws, e.g. for checkpoints"""
+        return {
+            'bit_generator': self.np_random.bit_generator.state,
+            'block': list(self._rng_block[self._rng_pos:]),
         }
+
+    def set_rng_state(self, state):
+        """Restores a snapshot taken with get_rng_state()"""
+        self.np_random.bit_generator.state = state['bit_generator']
+        self._rng_block = list(state['block'])
+        self._rng_pos = 0
+
+    def random(self):
+        """Draws a float in [0, 1) from the env's generator"""
+        if not self.rng_block_size:
+            return self.np_random.random()
+        if self._rng_pos == len(self._rng_block):
+            self._rng_block = self.np_random.random(self.rng_block_size).tolist()
+            self._rng_pos = 0
+        u = self._rng_block[self._rng_pos]
+        self._rng_pos += 1
+        return u
+
+    def random_choice(self, options):
+        """Picks a uniformly random element of a non-empty list"""
+        return options[int(self.random() * len(options))]
+
+    def reset(self, seed=None):
+        """Resets the game to the initial state, re-seeding the env's generator when a seed is given"""
+        if seed is not None:
+            self.seed_rng(seed)
+        rnd_indices = self.np_random.choice(len(self.layout.guard_rooms), size=len(self.guards), replace=False)
+        # Guards in random rooms (not the goal, the starting room or walls)
+        self.set_state(CastleState(
+            self.layout.start,
+            self.health_state_to_int['Full'],
+            tuple(self.layout.guard_rooms[i] for i in rnd_indices),
+        ))
         return self.get_observation(), 0, False, {}
 
+    def get_state(self):
+        """Snapshots the game state (see get_rng_state for the random generator)"""
+        return CastleState(self.player_position, self.player_health, self.guard_positions)
+
+    def set_state(self, state):
+        """Restores a snapshot taken with get_state()"""
+        self.player_position = state.player_position
+        self.player_health = state.player_health
+        # The room -> guard index only needs rebuilding when the guards differ from the current ones
+        if state.guard_positions is not self.guard_positions:
+            self.guard_positions = state.guard_positions
+            self.update_occupancy()
+
+    def update_occupancy(self):
+        """Rebuilds the room -> guard index, must be called whenever guard positions change"""
+        self.guard_at = dict(zip(self.guard_positions, self.guard_names))
+
+    @property
+    def current_state(self):
+        """Game state in the original dict format, as a view whose item writes update the env"""
+        return CurrentStateView(self)
+
+    @current_state.setter
+    def current_state(self, state):
+        view = CurrentStateView(self)
+        for key in view:
+            view[key] = state[key]
+
     def get_observation(self):
-        guard_in_cell = None
-        guard_positions = self.current_state['guard_positions']
-        player_position = self.current_state['player_position']
-        for guard in guard_positions:
-            if guard_positions[guard] == player_position:
-                guard_in_cell = guard
-                break
+        if self.flat_obs:
+            return self.get_state_hash()
 
         obs = {
-            'player_position': self.current_state['player_position'],
-            'player_health': self.health_state_to_int[self.current_state['player_health']],
-            'guard_in_cell': guard_in_cell if guard_in_cell else None,
+            'player_position': self.player_position,
+            'player_health': self.player_health,
+            'guard_in_cell': self.guard_in_room(),
         }
         return obs
 
+    def encode_state(self, position, health, guard_in_cell):
+        """Hashes a (position, health int, guard name or None) observation the same way as hash() in MBMC.py/MFMC.py"""
+        return self.room_offset[position] + self.health_offset[health] + self.guard_code[guard_in_cell]
+
+    def encode_observation(self, obs):
+        """Hashes an observation dict, flat observations are returned unchanged"""
+        if not isinstance(obs, dict):
+            return obs
+        return self.encode_state(obs['player_position'], obs['player_health'], obs['guard_in_cell'])
+
+    def decode_state(self, state):
+        """Returns the observation dict of a hashed state"""
+        position, health, guard = self.state_table[state]
+        return {'player_position': position, 'player_health': health, 'guard_in_cell': guard}
+
+    def get_transition_model(self, sparse=False):
+        """
+        Builds the exact transition and reward model over the hashed observation space.
+
+        Guard positions are not observed, so the guard met when entering a new room is
+        marginalised over the uniform placement done in reset(). Terminal states are absorbing
+        with zero reward.
+
+        Parameters:
+        - sparse (bool): Return P as a scipy.sparse CSR matrix of shape (S*A, S), row s*A + a,
+          instead of a dense (S, A, S) array.
+
+        Returns:
+        - P: Transition probabilities P[s, a, s'].
+        - R (numpy array): Expected immediate reward R[s, a] of shape (S, A), including the
+          goal and defeat rewards added by step().
+        """
+        num_actions = len(self.actions)
+        num_health = len(self.health_states)
+        num_guards = len(self.guards)
+        num_codes = num_guards + 1
+        num_cells = self.rows * self.cols
+        p_guard = 1.0 / len(self.layout.guard_rooms)
+
+        # Per-room tables over flat cell indices x*cols + y: intended move targets (-1 when out of
+        # bounds), slip targets, and the adjacent rooms the player lands in after fighting or hiding
+        # (the room itself when there are none)
+        def cell(room):
+            return room[0] * self.cols + room[1]
+        is_open = np.zeros(num_cells, dtype=bool)
+        is_guard_room = np.zeros(num_cells, dtype=bool)
+        is_open[[cell(room) for room in self.layout.open_rooms]] = True
+        is_guard_room[[cell(room) for room in self.layout.guard_rooms]] = True
+        target = np.full((num_cells, 4), -1, dtype=np.int64)
+        slips = np.zeros((num_cells, 4, 3), dtype=np.int64)
+        slip_count = np.zeros((num_cells, 4), dtype=np.int64)
+        adjacent = np.zeros((num_cells, 4), dtype=np.int64)
+        adjacent_count = np.ones(num_cells, dtype=np.int64)
+        for x, y in self.rooms:
+            c = cell((x, y))
+            directions = [(x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1)]
+            open_directions = [d for d, pos in enumerate(directions) if pos in self.layout.open_rooms]
+            for d in open_directions:
+                target[c, d] = cell(directions[d])
+                others = [cell(directions[b]) for b in open_directions if b != d]
+                slips[c, d, :len(others)] = others
+                slip_count[c, d] = len(others)
+            adjacent[c] = c
+            adjacent[c, :len(open_directions)] = [cell(directions[d]) for d in open_directions]
+            adjacent_count[c] = max(len(open_directions), 1)
+
+        # Every hashed state as (cell, health, guard code), in encode_state order
+        states = np.arange(self.num_states)
+        state_cell, rest = np.divmod(states, num_health * num_codes)
+        state_health, state_guard = np.divmod(rest, num_codes)
+        goal_cell = cell(self.goal_room)
+        # Walls are unreachable, they are kept as absorbing states so P stays stochastic
+        terminal = (state_cell == goal_cell) | (state_health == 0) | ~is_open[state_cell]
+        strength = np.array([0.0] + [self.guards[g]['strength'] for g in self.guard_names])
+        keenness = np.array([0.0] + [self.guards[g]['keenness'] for g in self.guard_names])
+
+        def outcomes():
+            """Yields (a, src, landing cell, landing health, probability, reward) arrays covering every (s, a)"""
+            active = ~terminal
+            guarded_states = np.flatnonzero(active & (state_guard > 0))
+            free_states = np.flatnonzero(active & (state_guard == 0))
+            absorbing = np.flatnonzero(terminal)
+            for a, action in enumerate(self.actions):
+                # Terminal states are absorbing with zero reward (reward None also skips terminal rewards)
+                yield a, absorbing, state_cell[absorbing], state_health[absorbing], np.ones(len(absorbing)), None
+                if a < 4:
+                    src = np.flatnonzero(active)
+                    move_to = target[state_cell[src], a]
+                    stay = src[(state_guard[src] > 0) | (move_to < 0)]
+                    yield a, stay, state_cell[stay], state_health[stay], np.ones(len(stay)), 0.0
+                    moving = src[(state_guard[src] == 0) & (move_to >= 0)]
+                    c, h = state_cell[moving], state_health[moving]
+                    yield a, moving, target[c, a], h, np.full(len(moving), 0.9), 0.0
+                    count = slip_count[c, a]
+                    stuck = count == 0
+                    yield a, moving[stuck], c[stuck], h[stuck], np.full(np.count_nonzero(stuck), 0.1), 0.0
+                    for j in range(3):
+                        slipping = count > j
+                        yield a, moving[slipping], slips[c[slipping], a, j], h[slipping], 0.1 / count[slipping], 0.0
+                    continue
+
+                # FIGHT and HIDE do nothing without a guard
+                yield a, free_states, state_cell[free_states], state_health[free_states], np.ones(len(free_states)), 0.0
+                src = guarded_states
+                c, h, g = state_cell[src], state_health[src], state_guard[src]
+                count = adjacent_count[c]
+                p_win = 1.0 - strength[g]
+                # A failed hide turns into a fight
+                p_fight = np.ones(len(src)) if action == 'FIGHT' else keenness[g]
+                for j in range(4):
+                    lands = count > j
+                    s, land, n = src[lands], adjacent[c[lands], j], count[lands]
+                    if action == 'HIDE':
+                        yield a, s, land, h[lands], (1.0 - keenness[g[lands]]) / n, 0.0
+                    yield a, s, land, h[lands], p_fight[lands] * p_win[lands] / n, self.rewards['combat_win']
+                    yield (a, s, land, np.maximum(h[lands] - 1, 0), p_fight[lands] * (1.0 - p_win[lands]) / n,
+                           self.rewards['combat_loss'])
+
+        def transitions(a, src, land, land_health, prob):
+            """Nonzero (row, s', probability) entries of landing in the given rooms"""
+            rows = src * num_actions + a
+            # The guard met on landing: unchanged when staying in the same room, none outside guard
+            # rooms, otherwise marginalised over the uniform guard placement done in reset()
+            base = (land * num_health + land_health) * num_codes
+            same = land == state_cell[src]
+            guarded = is_guard_room[land] & ~same
+            rows = np.concatenate((rows, np.repeat(rows[guarded], num_guards)))
+            cols = np.concatenate((base + np.where(same, state_guard[src], 0),
+                                   (base[guarded, None] + np.arange(1, num_codes)).ravel()))
+            probs = np.concatenate((prob * np.where(guarded, 1.0 - num_guards * p_guard, 1.0),
+                                    np.repeat(prob[guarded] * p_guard, num_guards)))
+            nonzero = probs > 0
+            return rows[nonzero], cols[nonzero], probs[nonzero]
+
+        # Two passes over the outcomes: count the nonzeros, then fill preallocated COO arrays
+        nnz = sum(len(transitions(*outcome[:5])[0]) for outcome in outcomes())
+        index_type = np.int32 if self.num_states * num_actions < 2**31 else np.int64
+        rows = np.empty(nnz, dtype=index_type)
+        cols = np.empty(nnz, dtype=index_type)
+        probs = np.empty(nnz)
+        R = np.zeros(self.num_states * num_actions)
+        filled = 0
+        for a, src, land, land_health, prob, reward in outcomes():
+            entry_rows, entry_cols, entry_probs = transitions(a, src, land, land_health, prob)
+            end = filled + len(entry_rows)
+            rows[filled:end], cols[filled:end], probs[filled:end] = entry_rows, entry_cols, entry_probs
+            filled = end
+            if reward is not None:
+                terminal_reward = np.where(land == goal_cell, self.rewards['goal'],
+                                           np.where(land_health == 0, self.rewards['defeat'], 0))
+                R += np.bincount(src * num_actions + a, weights=prob * (reward + terminal_reward), minlength=len(R))
+
+        R = R.reshape(self.num_states, num_actions)
+        if sparse:
+            from scipy.sparse import csr_matrix  # Only needed for the sparse model
+            P = csr_matrix((probs, (rows, cols)), shape=(self.num_states * num_actions, self.num_states))
+        else:
+            P = np.zeros((self.num_states * num_actions, self.num_states))
+            np.add.at(P, (rows, cols), probs)
+            P = P.reshape(self.num_states, num_actions, self.num_states)
+        return P, R
+
     def is_terminal(self):
         """Check if the game has reached a terminal state"""
-        if self.current_state['player_position'] == self.goal_room:  # Reaching the goal means victory
+        if self.player_position == self.goal_room:  # Reaching the goal means victory
             return 'goal'
-        if self.current_state['player_health'] == 'Critical':  # Losing health 3 times results in defeat
+        if self.player_health == 0:  # Losing health 3 times results in defeat
             return 'defeat'
         return False
 
-    def move_player(self, action):
-        """Move player based on the action, but prevent movement if a guard is in the same room"""
-        current_position = self.current_state['player_position']
-        guards_in_room = [
-            guard for guard in self.guards
-            if self.current_state['guard_positions'][guard] == current_position
-        ]
+    def guard_in_room(self):
+        """Returns the name of the guard in the player's room, or None"""
+        return self.guard_at.get(self.player_position)
+
+    def _move_player(self, action):
+        """Move player based on the action, returns (outcome, reward, guard)"""
+        guard = self.guard_in_room()
 
         # If there's a guard in the room, the player must fight or hide
-        if guards_in_room:
-            return f"Guard {guards_in_room[0]} is in the room! You must fight or hide.", 0
+        if guard:
+            return BLOCKED, 0, guard
 
-        x, y = self.current_state['player_position']
+        x, y = self.player_position
         directions = {
             'UP': (x - 1, y),
             'DOWN': (x + 1, y),
@@ -112,13 +480,13 @@ class CastleEscapeEnv(gym.Env):
         }
 
         # Calculate the intended move
-        new_position = directions.get(action, self.current_state['player_position'])
+        new_position = directions.get(action, self.player_position)
 
-        # Ensure new position is within bounds
-        if 0 <= new_position[0] < self.grid_size and 0 <= new_position[1] < self.grid_size:
+        # Ensure new position is within bounds (and not a wall)
+        if new_position in self.layout.open_rooms:
             # 90% chance to move as intended
-            if random.random() <= 0.9:
-                self.current_state['player_position'] = new_position
+            if self.random() <= 0.9:
+                self.player_position = new_position
             else:
                 # 10% chance to move to a random adjacent cell
                 adjacent_positions = [
@@ -126,115 +494,229 @@ class CastleEscapeEnv(gym.Env):
                 ]
                 adjacent_positions = [
                     pos for pos in adjacent_positions
-                    if 0 <= pos[0] < self.grid_size and 0 <= pos[1] < self.grid_size
+                    if pos in self.layout.open_rooms
                 ]
                 if adjacent_positions:
-                    self.current_state['player_position'] = random.choice(adjacent_positions)
-            return f"Moved to {self.current_state['player_position']}", 0
+                    self.player_position = self.random_choice(adjacent_positions)
+            return MOVED, 0, None
         else:
-            return "Out of bounds!", 0
+            return OUT_OF_BOUNDS, 0, None
 
     def move_player_to_random_adjacent(self):
         """Move player to a random adjacent cell without going out of bounds"""
-        x, y = self.current_state['player_position']
+        x, y = self.player_position
         directions = [(x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1)]
 
-        # Filter out-of-bounds positions
+        # Filter out-of-bounds positions and walls
         adjacent_positions = [
             pos for pos in directions
-            if 0 <= pos[0] < self.grid_size and 0 <= pos[1] < self.grid_size
+            if pos in self.layout.open_rooms
         ]
 
         # Move player to a random adjacent position
         if adjacent_positions:
-            self.current_state['player_position'] = random.choice(adjacent_positions)
+            self.player_position = self.random_choice(adjacent_positions)
 
-    def try_fight(self):
-        """Player chooses to fight the guard"""
-        current_position = self.current_state['player_position']
-        guards_in_room = [
-            guard for guard in self.guards
-            if self.current_state['guard_positions'][guard] == current_position
-        ]
+    def _try_fight(self):
+        """Player chooses to fight the guard, returns (outcome, reward, guard)"""
+        guard = self.guard_in_room()
 
-        if guards_in_room:
-            guard = guards_in_room[0]  # Choose one guard to fight
+        if guard:
             strength = self.guards[guard]['strength']
 
             # Player tries to fight the guard
-            if random.random() > strength:  # Successful fight
+            if self.random() > strength:  # Successful fight
                 self.move_player_to_random_adjacent()  # Move player to a random adjacent cell after victory
-                return f"Fought {guard} and won!", self.rewards['combat_win']
+                return FIGHT_WON, self.rewards['combat_win'], guard
             else:  # Player loses the fight
-                if self.current_state['player_health'] == 'Full':
-                    self.current_state['player_health'] = 'Injured'
-                elif self.current_state['player_health'] == 'Injured':
-                    self.current_state['player_health'] = 'Critical'
+                if self.player_health > 0:  # Full -> Injured -> Critical
+                    self.player_health -= 1
                 self.move_player_to_random_adjacent()  # Move player to a random adjacent cell after defeat
-                return f"Fought {guard} and lost!", self.rewards['combat_loss']
-        return "No guard to fight!", 0
+                return FIGHT_LOST, self.rewards['combat_loss'], guard
+        return NO_GUARD_TO_FIGHT, 0, None
 
-    def try_hide(self):
-        """Player attempts to hide from the guard"""
-        current_position = self.current_state['player_position']
-        guards_in_room = [
-            guard for guard in self.guards
-            if self.current_state['guard_positions'][guard] == current_position
-        ]
+    def _try_hide(self):
+        """Player attempts to hide from the guard, returns (outcome, reward, guard)"""
+        guard = self.guard_in_room()
 
-        if guards_in_room:
-            guard = guards_in_room[0]  # Choose one guard to hide from
+        if guard:
             keenness = self.guards[guard]['keenness']
 
             # Player tries to hide
-            if random.random() > keenness:  # Successful hide
+            if self.random() > keenness:  # Successful hide
                 self.move_player_to_random_adjacent()  # Move player to a random adjacent cell after successfully hiding
-                return f"Successfully hid from {guard}!", 0
+                return HID, 0, guard
             else:
-                return self.try_fight()  # Hide failed, must fight
-        return "No guard to hide from!", 0
+                return self._try_fight()  # Hide failed, must fight
+        return NO_GUARD_TO_HIDE, 0, None
 
-    def play_turn(self, action):
-        """Take an action and update the state"""
+    def _play_turn(self, action):
+        """Take an action and update the state, returns (outcome, reward, guard)"""
         if action in ['UP', 'DOWN', 'LEFT', 'RIGHT']:
-            return self.move_player(action)
+            return self._move_player(action)
         elif action == 'FIGHT':
-            return self.try_fight()
+            return self._try_fight()
         elif action == 'HIDE':
-            return self.try_hide()
+            return self._try_hide()
         else:
-            return "Invalid action!", 0
+            return INVALID_ACTION, 0, None
 
-    def step(self, action):
-        """Performs one step in the environment"""
+    def move_player(self, action):
+        """Move player based on the action, but prevent movement if a guard is in the same room"""
+        outcome, reward, guard = self._move_player(action)
+        return self.describe_result(outcome, guard), reward
+
+    def try_fight(self):
+        """Player chooses to fight the guard"""
+        outcome, reward, guard = self._try_fight()
+        return self.describe_result(outcome, guard), reward
 
+    def try_hide(self):
+        """Player attempts to hide from the guard"""
+        outcome, reward, guard = self._try_hide()
+        return self.describe_result(outcome, guard), reward
+
+    def play_turn(self, action):
+        """Take an action and update the state"""
+        outcome, reward, guard = self._play_turn(action)
+        return self.describe_result(outcome, guard), reward
+
+    def describe_result(self, outcome, guard=None, terminal_state=False, position=None):
+        """Builds the human-readable result message of a turn"""
+        if position is None:
+            position = self.player_position
+        result = RESULT_MESSAGES[outcome].format(guard=guard, position=position)
+        if terminal_state == 'goal':
+            result += f" You've reached the goal! {self.rewards['goal']} points!"
+        elif terminal_state == 'defeat':
+            result += f" You've been caught! {self.rewards['combat_loss']} points!"
+        return result
+
+    def describe_last_step(self):
+        """Builds the result message of the last step() or step_fast() call on demand"""
+        return self.describe_result(*self.last_step[:4])
+
+    def last_step_result(self):
+        """Returns the (observation, reward, done, info) step() would have returned for the last step"""
+        reward, done, action_name = self.last_step[4:]
+        info = {'result': self.describe_last_step(), 'action': action_name}
+        return self.get_observation(), reward, done, info
+
+    def _step(self, action):
+        """Plays one turn and returns (reward, done, action name), recording it in last_step"""
         ## Thisis a fix for gym environment. 
         if (isinstance(action, str)):
             action = self.actions.index(action)
 
         action_name = self.actions[action]
-        result, reward = self.play_turn(action_name)
+        outcome, reward, guard = self._play_turn(action_name)
 
         done = False
         terminal_state = self.is_terminal()
         if terminal_state == 'goal':
             done = True
             reward += self.rewards['goal']
-            result += f" You've reached the goal! {self.rewards['goal']} points!"
         elif terminal_state == 'defeat':
             done = True
             reward += self.rewards['defeat']
-            result += f" You've been caught! {self.rewards['combat_loss']} points!"
+
+        self.last_step = (outcome, guard, terminal_state, self.player_position, reward, done, action_name)
+        return reward, done, action_name
+
+    def step(self, action):
+        """Performs one step in the environment"""
+        reward, done, action_name = self._step(action)
 
         observation = self.get_observation()
-        info = {'result': result, 'action': action_name}
+        info = {'result': self.describe_last_step(), 'action': action_name}
 
         return observation, reward, done, info
 
+    def step_fast(self, action):
+        """
+        Performs one step without building messages or observation dicts.
+
+        Returns:
+        - state (int): Hashed next state (see encode_state).
+        - reward (int): Reward of the step.
+        - done (bool): Whether a terminal state was reached.
+
+        The result message of step() is available on demand through describe_last_step().
+        """
+        reward, done, _ = self._step(action)
+        return self.get_state_hash(), reward, done
+
+    def get_state_hash(self):
+        """Returns the hashed current observation without building the observation dict"""
+        return (
+            self.room_offset[self.player_position]
+            + self.health_offset[self.player_health]
+            + self.guard_code[self.guard_in_room()]
+        )
+
     def render(self, mode='human'):
-        """Renders the current state"""
+        """Renders the current state, printing it or, with mode='rgb_array', returning an RGB frame"""
+        if mode == 'rgb_array':
+            return self.render_rgb_array()
         print(f"Current state: {self.current_state}")
 
+    def render_rgb_array(self):
+        """
+        Draws the current state into an offscreen (height, width, 3) uint8 array, no display needed.
+
+        Rooms are render_cell_size pixels wide. Guards are red squares, the player a green circle
+        (drawn next to the guard when sharing a room) and the strip below the grid shows health.
+        """
+        cs = self.render_cell_size
+        if getattr(self, '_render_background', None) is None:
+            self._build_render_background()
+        frame = self._render_background.copy()
+        colors = self.render_colors
+
+        guard_room = self.guard_in_room()
+        for guard, (x, y) in zip(self.guard_names, self.guard_positions):
+            if guard == guard_room:  # Smaller guard on the right half of the shared room
+                frame[x * cs + 3 * cs // 8:x * cs + 5 * cs // 8, y * cs + 5 * cs // 8:y * cs + 7 * cs // 8] = colors['guard']
+            else:
+                frame[x * cs + cs // 4:x * cs + 3 * cs // 4, y * cs + cs // 4:y * cs + 3 * cs // 4] = colors['guard']
+
+        x, y = self.player_position
+        offset = cs // 4 if guard_room else cs // 2
+        mask = self._render_small_disc if guard_room else self._render_disc
+        r = mask.shape[0] // 2
+        top, left = x * cs + cs // 2 - r, y * cs + offset - r
+        frame[top:top + mask.shape[0], left:left + mask.shape[1]][mask] = colors['player']
+
+        # Health strip: one block per remaining health level
+        strip = self.rows * cs + cs // 8
+        for level in range(self.player_health):
+            frame[strip:strip + cs // 4, cs // 8 + level * cs:(level + 1) * cs - cs // 8] = colors['health']
+        return frame
+
+    def _build_render_background(self):
+        """Pre-renders the static grid, walls and goal room used by render_rgb_array"""
+        cs = self.render_cell_size
+        colors = self.render_colors
+        height, width = self.rows * cs + cs // 2, self.cols * cs
+        background = np.empty((height, width, 3), dtype=np.uint8)
+        background[:] = colors['background']
+        background[self.rows * cs:] = colors['console']
+        for x, y in self.layout.walls:
+            background[x * cs:(x + 1) * cs, y * cs:(y + 1) * cs] = colors['wall']
+        gx, gy = self.goal_room
+        background[gx * cs + 1:(gx + 1) * cs - 1, gy * cs + 1:(gy + 1) * cs - 1] = colors['goal']
+        background[0:self.rows * cs:cs, :] = colors['grid']
+        background[:self.rows * cs, 0:width:cs] = colors['grid']
+        background[self.rows * cs - 1, :] = colors['grid']
+        background[:self.rows * cs, width - 1] = colors['grid']
+        self._render_background = background
+
+        def disc(radius):
+            d = np.arange(-radius, radius + 1)
+            return d[:, None] ** 2 + d[None, :] ** 2 <= radius * radius
+        self._render_disc = disc(cs // 4)
+        self._render_small_disc = disc(cs // 6)
+
     def close(self):
         """Performs cleanup"""
         pass
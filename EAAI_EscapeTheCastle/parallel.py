@@ -0,0 +1,238 @@
+import multiprocessing
+from multiprocessing import shared_memory
+import numpy as np
+from mdp_gym import CastleEscapeEnv
+from collectors import TransitionCollector
+from qlearning import QTable
+
+
+def _play(env, num_episodes, policy, rng, max_steps=1000):
+    """Plays num_episodes episodes and returns (collector, returns, lengths, truncated)"""
+    collector = TransitionCollector(env)
+    fight = env.actions.index('FIGHT')
+    returns = np.zeros(num_episodes)
+    lengths = np.zeros(num_episodes, dtype=np.int64)
+    truncated = np.zeros(num_episodes, dtype=bool)
+
+    for episode in range(num_episodes):
+        env.reset()
+        state = env.get_state_hash()
+        done = False
+        while not done and lengths[episode] < max_steps:
+            if policy is None:
+                # Fight whenever a guard is present, otherwise move randomly
+                action = fight if collector.decode(state)[1] else int(rng.integers(4))
+            elif callable(policy):
+                action = int(policy(state, rng))
+            else:
+                action = int(policy[state])
+            next_state, reward, done = env.step_fast(action)
+            collector.update(state, action, reward, next_state, done)
+            returns[episode] += reward
+            lengths[episode] += 1
+            state = next_state
+        truncated[episode] = not done
+
+    return collector, returns, lengths, truncated
+
+
+def _rollout_worker(args):
+    """Runs one worker's share of episodes with its own env and seed stream"""
+    num_episodes, seed_seq, policy, layout, max_steps = args
+    env_seed, policy_seed = seed_seq.spawn(2)
+    env = CastleEscapeEnv(seed=env_seed, layout=layout)
+    return _play(env, num_episodes, policy, np.random.default_rng(policy_seed), max_steps)
+
+
+def run_rollouts(num_episodes, num_workers=None, seed=0, policy=None, layout=None, max_steps=1000):
+    """
+    Plays CastleEscapeEnv episodes across a process pool and merges the results.
+
+    Episodes are split evenly over the workers and each worker gets an independent child of
+    numpy.random.SeedSequence(seed), so results are identical for a given seed and worker count.
+
+    Parameters:
+    - num_episodes (int): Total number of episodes.
+    - num_workers (int): Number of processes, defaults to the CPU count.
+    - seed (int): Master seed.
+    - policy: None to fight whenever a guard is present and otherwise move randomly, an array
+      mapping hashed states to actions, or a picklable callable policy(state, rng) -> action.
+    - layout (CastleLayout): Castle played by every worker, the default 5x5 castle when None.
+    - max_steps (int): Step limit per episode, episodes still running are cut off and flagged as truncated.
+
+    Returns:
+    - results (dict): 'collector' (merged TransitionCollector), 'returns', 'lengths' and 'truncated'
+      (per-episode arrays ordered by worker).
+    """
+    if num_workers is None:
+        num_workers = multiprocessing.cpu_count()
+    shares = [len(chunk) for chunk in np.array_split(np.arange(num_episodes), num_workers)]
+    seeds = np.random.SeedSequence(seed).spawn(num_workers)
+    tasks = list(zip(shares, seeds, [policy] * num_workers, [layout] * num_workers, [max_steps] * num_workers))
+
+    if num_workers == 1:
+        outputs = [_rollout_worker(tasks[0])]
+    else:
+        with multiprocessing.Pool(num_workers) as pool:
+            outputs = pool.map(_rollout_worker, tasks)
+
+    collector = outputs[0][0]
+    for other, *_ in outputs[1:]:
+        collector.merge(other)
+    return {
+        'collector': collector,
+        'returns': np.concatenate([output[1] for output in outputs]),
+        'lengths': np.concatenate([output[2] for output in outputs]),
+        'truncated': np.concatenate([output[3] for output in outputs]),
+    }
+
+
+def _attach(shm, num_states, num_actions):
+    """QTable whose values and counts are views of a shared memory block"""
+    table = QTable.__new__(QTable)
+    table.values = np.ndarray((num_states, num_actions), dtype=np.float64, buffer=shm.buf)
+    table.counts = np.ndarray((num_states, num_actions), dtype=np.int64, buffer=shm.buf, offset=table.values.nbytes)
+    table.metadata = {}
+    return table
+
+
+def _merge(shared, local, base_values, base_counts):
+    """
+    Adds the updates a worker made since its last merge to the shared table.
+
+    With eta = 1/(1+n), Q(s,a) * n(s,a) is the sum of all targets seen for (s,a), so the local targets
+    are local Q * n minus the same product at the last merge, and the merged value is the count-weighted
+    mean of shared and local targets.
+    """
+    delta = local.counts - base_counts
+    changed = delta > 0
+    target_sums = local.values[changed] * local.counts[changed] - base_values[changed] * base_counts[changed]
+    n = shared.counts[changed]
+    shared.values[changed] = (shared.values[changed] * n + target_sums) / (n + delta[changed])
+    shared.counts[changed] = n + delta[changed]
+
+
+def _q_learning_worker(shm_name, num_states, num_actions, episode_counter, merge_lock, seed_seq, params):
+    """Attaches to the shared Q-table and trains on it until the global episode budget is used up"""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        _train_shared(_attach(shm, num_states, num_actions), episode_counter, merge_lock, seed_seq, params)
+    finally:
+        shm.close()
+
+
+def _train_shared(shared, episode_counter, merge_lock, seed_seq, params):
+    """Worker training loop on a shared QTable, see parallel_q_learning"""
+    num_episodes, gamma, epsilon, decay_rate, mode, merge_every, layout = params
+    num_states, num_actions = shared.num_states, shared.num_actions
+    env_seed, policy_seed = seed_seq.spawn(2)
+    env = CastleEscapeEnv(seed=env_seed, layout=layout)
+    rng = np.random.default_rng(policy_seed)
+
+    if mode == 'hogwild':
+        q_table = shared  # Lock-free updates straight into shared memory
+    else:
+        with merge_lock:
+            base_values, base_counts = shared.values.copy(), shared.counts.copy()
+        q_table = QTable(num_states, num_actions)
+        q_table.values[:], q_table.counts[:] = base_values, base_counts
+    values = q_table.values
+
+    local_episodes = 0
+    while True:
+        # Claim the next global episode, epsilon follows the global episode index
+        with episode_counter.get_lock():
+            episode = episode_counter.value
+            if episode >= num_episodes:
+                break
+            episode_counter.value = episode + 1
+        episode_epsilon = epsilon * decay_rate ** episode
+
+        env.reset()
+        state = env.get_state_hash()
+        done = False
+        while not done:
+            if rng.random() < episode_epsilon:
+                action = int(rng.integers(num_actions))
+            else:
+                action = int(values[state].argmax())
+            next_state, reward, done = env.step_fast(action)
+            q_table.update(state, action, reward, next_state, done, gamma)
+            state = next_state
+
+        local_episodes += 1
+        if mode == 'merge' and local_episodes % merge_every == 0:
+            with merge_lock:
+                _merge(shared, q_table, base_values, base_counts)
+                base_values, base_counts = shared.values.copy(), shared.counts.copy()
+            values[:], q_table.counts[:] = base_values, base_counts
+
+    if mode == 'merge':
+        with merge_lock:
+            _merge(shared, q_table, base_values, base_counts)
+
+
+def parallel_q_learning(num_episodes=10000, num_workers=None, gamma=0.9, epsilon=1, decay_rate=0.999, seed=0,
+                        mode='hogwild', merge_every=100, layout=None):
+    """
+    Q-learning with several processes sharing one Q-table and update-count array in shared memory.
+
+    Workers claim episodes from a shared counter and use epsilon * decay_rate ** (global episode index),
+    so epsilon decays as in the single-process q_learning however the episodes are spread. Results are
+    not reproducible across runs since the interleaving of the workers varies.
+
+    Parameters:
+    - num_episodes (int): Total number of episodes over all workers.
+    - num_workers (int): Number of processes, defaults to the CPU count.
+    - gamma (float): Discount factor.
+    - epsilon (float): Initial exploration rate.
+    - decay_rate (float): Epsilon decay per global episode.
+    - seed (int): Master seed, each worker gets an independent child of numpy.random.SeedSequence(seed).
+    - mode (str): 'hogwild' to update the shared table without locks, or 'merge' to train on a local copy
+      and fold its updates into the shared table, count-weighted and under a lock, every merge_every
+      local episodes.
+    - merge_every (int): Episodes between merges in 'merge' mode.
+    - layout (CastleLayout): Castle trained on by every worker, the default 5x5 castle when None.
+
+    Returns:
+    - q_table (QTable): The trained table, use q_table.to_dict() for the {state: {action: q}} format.
+    """
+    if mode not in ('hogwild', 'merge'):
+        raise ValueError(f"Unknown mode {mode!r}, expected 'hogwild' or 'merge'")
+    if num_workers is None:
+        num_workers = multiprocessing.cpu_count()
+    env = CastleEscapeEnv(layout=layout)
+    num_states, num_actions = env.num_states, len(env.actions)
+    size = num_states * num_actions * (np.dtype(np.float64).itemsize + np.dtype(np.int64).itemsize)
+
+    shm = shared_memory.SharedMemory(create=True, size=size)
+    shared = None
+    try:
+        shared = _attach(shm, num_states, num_actions)
+        shared.values[:] = 0
+        shared.counts[:] = 0
+        episode_counter = multiprocessing.Value('q', 0)
+        merge_lock = multiprocessing.Lock()
+        params = (num_episodes, gamma, epsilon, decay_rate, mode, merge_every, layout)
+        workers = [
+            multiprocessing.Process(target=_q_learning_worker, args=(
+                shm.name, num_states, num_actions, episode_counter, merge_lock, seed_seq, params))
+            for seed_seq in np.random.SeedSequence(seed).spawn(num_workers)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        if any(worker.exitcode != 0 for worker in workers):
+            raise RuntimeError("A Q-learning worker process failed")
+
+        q_table = QTable(num_states, num_actions)
+        q_table.values[:] = shared.values
+        q_table.counts[:] = shared.counts
+    finally:
+        shared = None  # Release the views before closing the block
+        shm.close()
+        shm.unlink()
+    q_table.metadata.update(gamma=gamma, decay_rate=decay_rate, seed=seed, episodes=num_episodes,
+                            num_workers=num_workers, mode=mode)
+    return q_table
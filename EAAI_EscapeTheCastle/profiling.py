@@ -0,0 +1,149 @@
+import time
+from collections import Counter
+
+
+# Env methods timed by default: the step/reset entry points, turn dispatch, guard lookups, RNG and
+# observation building/hashing
+PROFILED_METHODS = (
+    'reset', 'step', 'step_fast', '_step', '_play_turn', '_move_player', '_try_fight', '_try_hide',
+    'move_player_to_random_adjacent', 'is_terminal', 'guard_in_room', 'random', 'get_observation',
+    'get_state_hash', 'encode_observation',
+)
+
+
+class EnvProfiler:
+    """
+    Opt-in call counters, timers and episode statistics for one CastleEscapeEnv.
+
+    enable() shadows the profiled methods with timing wrappers on the env instance only, and
+    disable() removes them again, so an env that is not being profiled runs its plain class methods.
+    Times are inclusive: step includes the time of _step, which includes _play_turn, and so on.
+    """
+
+    def __init__(self, env, methods=PROFILED_METHODS, snapshot_every=0, on_snapshot=None):
+        """
+        Parameters:
+        - env (CastleEscapeEnv): Env to instrument.
+        - methods (iterable of str): Names of the env methods to time.
+        - snapshot_every (int): Call on_snapshot(snapshot()) every snapshot_every finished episodes (0 = never).
+        - on_snapshot (callable): Receives the periodic snapshots, e.g. a logger or list.append.
+        """
+        self.env = env
+        self.methods = tuple(methods)
+        self.snapshot_every = snapshot_every
+        self.on_snapshot = on_snapshot
+        self.enabled = False
+        self.clear()
+
+    def clear(self):
+        """Resets all counters"""
+        self.calls = Counter()
+        self.seconds = Counter()
+        self.actions = Counter()
+        self.outcomes = Counter()
+        self.episode_lengths = Counter()
+        self.episode_steps = 0
+        self.num_episodes = 0
+
+    def enable(self):
+        """Installs the timing wrappers on the env"""
+        if self.enabled:
+            return self
+        for name in self.methods:
+            setattr(self.env, name, self._timed(name, getattr(self.env, name)))
+        # _step additionally feeds the action, episode length and outcome statistics
+        step = self.env.__dict__.get('_step', self.env._step)
+        self.env._step = self._count_step(step)
+        # reset() ends an unfinished episode (truncation, step limits) without recording its length
+        reset = self.env.__dict__.get('reset', self.env.reset)
+        self.env.reset = self._count_reset(reset)
+        self.enabled = True
+        return self
+
+    def disable(self):
+        """Removes the wrappers, restoring the env's own methods"""
+        if not self.enabled:
+            return self
+        for name in set(self.methods) | {'_step', 'reset'}:
+            self.env.__dict__.pop(name, None)
+        self.enabled = False
+        return self
+
+    def __enter__(self):
+        return self.enable()
+
+    def __exit__(self, *exc_info):
+        self.disable()
+
+    def _timed(self, name, method):
+        calls, seconds, clock = self.calls, self.seconds, time.perf_counter
+
+        def wrapper(*args, **kwargs):
+            start = clock()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                seconds[name] += clock() - start
+                calls[name] += 1
+        return wrapper
+
+    def _count_step(self, step):
+        env = self.env
+
+        def wrapper(action):
+            result = step(action)
+            _, _, terminal_state, _, _, done, action_name = env.last_step
+            self.actions[action_name] += 1
+            self.episode_steps += 1
+            if done:
+                self.outcomes[terminal_state] += 1
+                self.episode_lengths[self.episode_steps] += 1
+                self.episode_steps = 0
+                self.num_episodes += 1
+                if self.snapshot_every and self.on_snapshot is not None and self.num_episodes % self.snapshot_every == 0:
+                    self.on_snapshot(self.snapshot())
+            return result
+        return wrapper
+
+    def _count_reset(self, reset):
+        def wrapper(*args, **kwargs):
+            self.episode_steps = 0
+            return reset(*args, **kwargs)
+        return wrapper
+
+    def snapshot(self):
+        """
+        Returns the current statistics as a plain dict.
+
+        Returns:
+        - snapshot (dict): 'methods' (name -> {'calls', 'seconds', 'mean_us'}), 'actions' histogram,
+          'outcomes' ('goal'/'defeat' counts), 'episode_lengths' histogram and 'episodes'.
+        """
+        return {
+            'episodes': self.num_episodes,
+            'methods': {
+                name: {
+                    'calls': self.calls[name],
+                    'seconds': self.seconds[name],
+                    'mean_us': 1e6 * self.seconds[name] / self.calls[name],
+                }
+                for name in self.methods if self.calls[name]
+            },
+            'actions': dict(self.actions),
+            'outcomes': dict(self.outcomes),
+            'episode_lengths': dict(sorted(self.episode_lengths.items())),
+        }
+
+    def summary(self):
+        """Formats the statistics as a human-readable table"""
+        snapshot = self.snapshot()
+        lines = [f"{'method':32s} {'calls':>10s} {'total s':>10s} {'mean us':>10s}"]
+        for name, stats in sorted(snapshot['methods'].items(), key=lambda item: -item[1]['seconds']):
+            lines.append(f"{name:32s} {stats['calls']:10d} {stats['seconds']:10.4f} {stats['mean_us']:10.2f}")
+        lines.append(f"Episodes: {snapshot['episodes']}  Outcomes: {snapshot['outcomes']}")
+        lines.append(f"Actions: {snapshot['actions']}")
+        if self.episode_lengths:
+            total = sum(self.episode_lengths.values())
+            mean = sum(length * count for length, count in self.episode_lengths.items()) / total
+            lines.append(f"Episode length: mean {mean:.2f}, min {min(self.episode_lengths)}, max {max(self.episode_lengths)}")
+        return '\n'.join(lines)
@@ -0,0 +1,344 @@
+import heapq
+import json
+import os
+import numpy as np
+
+
+class QTable:
+    """Array-backed Q-table holding Q-values and per-(s,a) update counts over the hashed state space"""
+
+    def __init__(self, num_states, num_actions):
+        self.values = np.zeros((num_states, num_actions))
+        self.counts = np.zeros((num_states, num_actions), dtype=np.int64)
+        # Training settings stored alongside the arrays by save() (gamma, decay_rate, episodes, seed, ...)
+        self.metadata = {}
+
+    @property
+    def num_states(self):
+        return self.values.shape[0]
+
+    @property
+    def num_actions(self):
+        return self.values.shape[1]
+
+    def greedy_action(self, state):
+        """Returns the action with the highest Q-value in the given state"""
+        return int(self.values[state].argmax())
+
+    def update(self, state, action, reward, next_state, done, gamma):
+        """Q-learning update with eta = 1/(1 + number of updates to Q(s,a))"""
+        n = self.counts[state, action]
+        target = reward if done else reward + gamma * self.values[next_state].max()
+        self.values[state, action] += (target - self.values[state, action]) / (1 + n)
+        self.counts[state, action] = n + 1
+
+    def update_batch(self, states, actions, targets):
+        """
+        Applies the eta = 1/(1+n) update for a batch of (s, a, target) triples with NumPy scatters.
+
+        A pair appearing m times ends up exactly as if its m updates were applied one after another,
+        in any order: Q' = (n*Q + sum of targets) / (n + m), since Q * n is the running sum of targets.
+        """
+        pairs = np.asarray(states) * self.num_actions + np.asarray(actions)
+        values, counts = self.values.reshape(-1), self.counts.reshape(-1)
+        batch_counts = np.bincount(pairs, minlength=len(values))
+        target_sums = np.bincount(pairs, weights=targets, minlength=len(values))
+        touched = np.flatnonzero(batch_counts)
+        n, m = counts[touched], batch_counts[touched]
+        values[touched] = (n * values[touched] + target_sums[touched]) / (n + m)
+        counts[touched] = n + m
+
+    def to_dict(self, visited_only=True):
+        """
+        Converts the table into the {state: {action: q}} dict format required by MFMC.py.
+
+        Parameters:
+        - visited_only (bool): Only export (s,a) pairs that have been updated at least once.
+
+        Returns:
+        - Q_table (dict): Dictionary containing the Q-values for each state-action pair.
+        """
+        values = self.values.tolist()
+        if not visited_only:
+            return {s: dict(enumerate(row)) for s, row in enumerate(values)}
+        Q_table = {}
+        for s, a in zip(*np.nonzero(self.counts)):
+            Q_table.setdefault(int(s), {})[int(a)] = values[s][a]
+        return Q_table
+
+    @classmethod
+    def from_dict(cls, Q_table, num_states, num_actions):
+        """Builds a QTable from a {state: {action: q}} dict, marking every listed pair as visited once"""
+        table = cls(num_states, num_actions)
+        for s, actions in Q_table.items():
+            for a, q in actions.items():
+                table.values[s, a] = q
+                table.counts[s, a] = max(table.counts[s, a], 1)
+        return table
+
+    def save(self, path, **metadata):
+        """
+        Saves Q-values, visit counts and metadata to an uncompressed .npz file, no pickling involved.
+
+        Parameters:
+        - path (str or file): Output file, '.npz' is appended by NumPy to names without it.
+        - metadata: JSON-serializable training settings, merged into self.metadata.
+        """
+        self.metadata.update(metadata)
+        np.savez(path, values=self.values, counts=self.counts, metadata=np.array(json.dumps(self.metadata)))
+
+    @classmethod
+    def load(cls, path):
+        """
+        Loads a table written by save(). Each array is a single contiguous read, so this stays fast
+        for large layouts.
+
+        Returns:
+        - q_table (QTable): The table, with the saved settings in q_table.metadata.
+        """
+        with np.load(path) as data:
+            table = cls.__new__(cls)
+            table.values = data['values']
+            table.counts = data['counts']
+            table.metadata = json.loads(data['metadata'].item())
+        return table
+
+    def to_policy(self):
+        """Greedy action for every state as an int array, for play and batch evaluation"""
+        return self.values.argmax(axis=1)
+
+
+class DynaModel:
+    """
+    Maximum likelihood model of the observed transitions, used for prioritized sweeping planning updates.
+
+    Stores next-state counts and reward sums per (s, a), like the counts MBMC.py estimates, plus the
+    observed predecessors of every state so that a changed Q-value can be propagated backwards.
+    """
+
+    def __init__(self, env, gamma, priority_threshold=1e-3):
+        num_actions = len(env.actions)
+        self.gamma = gamma
+        self.priority_threshold = priority_threshold
+        # Terminal states have no future value
+        self.terminal_states = env.terminal_states.tolist()
+        self.next_counts = {}  # (s, a) -> {s': count}
+        self.visits = np.zeros((env.num_states, num_actions), dtype=np.int64)
+        self.reward_sums = np.zeros((env.num_states, num_actions))
+        self.predecessors = {}  # s' -> {(s, a)}
+        self.state_values = [0.0] * env.num_states  # max_a Q(s, a), kept in sync with the Q-table
+        self.queue = []  # Max-heap of (-priority, s, a), entries superseded in queued are skipped
+        self.queued = {}  # (s, a) -> priority of its live queue entry
+
+    def update(self, values, state, action, reward, next_state):
+        """Records one observed transition after the real Q update of (s, a)"""
+        counts = self.next_counts.setdefault((state, action), {})
+        counts[next_state] = counts.get(next_state, 0) + 1
+        self.visits[state, action] += 1
+        self.reward_sums[state, action] += reward
+        self.predecessors.setdefault(next_state, set()).add((state, action))
+        self.state_values[state] = float(values[state].max())
+        self.push(values, state, action)
+
+    def backup(self, values, state, action):
+        """Expected one-step target R(s,a) + gamma * sum_s' P(s'|s,a) max_a' Q(s',a') under the model"""
+        state_values, terminal_states = self.state_values, self.terminal_states
+        future = 0.0
+        for next_state, count in self.next_counts[(state, action)].items():
+            if not terminal_states[next_state]:
+                future += count * state_values[next_state]
+        return (self.reward_sums[state, action] + self.gamma * future) / self.visits[state, action]
+
+    def push(self, values, state, action):
+        """Queues (s, a) when its Bellman error exceeds the priority threshold"""
+        priority = abs(self.backup(values, state, action) - values[state, action])
+        if priority > self.priority_threshold and priority > self.queued.get((state, action), 0.0):
+            self.queued[(state, action)] = priority
+            heapq.heappush(self.queue, (-priority, state, action))
+
+    def plan(self, values, num_updates):
+        """Applies up to num_updates model backups in order of Bellman error, queueing affected predecessors"""
+        queue, queued = self.queue, self.queued
+        updates = 0
+        while queue and updates < num_updates:
+            priority, state, action = heapq.heappop(queue)
+            if queued.get((state, action)) != -priority:
+                continue  # Superseded by a higher priority entry
+            del queued[(state, action)]
+            values[state, action] = self.backup(values, state, action)
+            self.state_values[state] = float(values[state].max())
+            updates += 1
+            for predecessor in self.predecessors.get(state, ()):
+                self.push(values, *predecessor)
+
+
+def save_checkpoint(path, q_table, epsilon, episode, rng, env):
+    """
+    Atomically writes a training checkpoint: a QTable.save() file whose metadata also holds a
+    'checkpoint' entry with epsilon, the episode index and the states of the learner's and the env's
+    random generators.
+
+    The file is written next to path and renamed over it, so a killed job never leaves a torn checkpoint.
+    """
+    env_rng = env.get_rng_state()
+    checkpoint = {
+        'epsilon': epsilon,
+        'episode': episode,
+        'rng': rng.bit_generator.state,
+        'env_rng': env_rng['bit_generator'],
+        'env_rng_block': env_rng['block'],  # JSON floats round-trip exactly
+    }
+    tmp_path = f'{path}.tmp'
+    try:
+        with open(tmp_path, 'wb') as f:
+            q_table.save(f, checkpoint=checkpoint)
+            f.flush()
+            os.fsync(f.fileno())
+    finally:
+        # The training state only belongs in this file, not in later plain saves of the table
+        q_table.metadata.pop('checkpoint', None)
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(path, env):
+    """
+    Loads a checkpoint written by save_checkpoint and restores the env's generator from it.
+
+    Returns:
+    - q_table (QTable): The saved table.
+    - epsilon (float): Exploration rate at the checkpoint.
+    - episode (int): Number of episodes completed.
+    - rng (numpy.random.Generator): The learner's generator, restored to its saved state.
+    """
+    q_table = QTable.load(path)
+    checkpoint = q_table.metadata.pop('checkpoint', None)
+    if checkpoint is None:
+        raise ValueError(
+            f"{path} is a saved Q-table without training state and cannot be resumed bit-identically; "
+            f"continue training from it with q_table=QTable.load({path!r}) instead")
+    env.set_rng_state({'bit_generator': checkpoint['env_rng'], 'block': checkpoint['env_rng_block']})
+    rng = np.random.default_rng()
+    rng.bit_generator.state = checkpoint['rng']
+    return q_table, checkpoint['epsilon'], checkpoint['episode'], rng
+
+
+def q_learning(env, num_episodes=10000, gamma=0.9, epsilon=1, decay_rate=0.999, seed=None, q_table=None, callback=None,
+               checkpoint_path=None, checkpoint_every=1000, resume_from=None, planning_steps=0, priority_threshold=1e-3):
+    """
+    Run tabular Q-learning on a CastleEscapeEnv with an array-backed Q-table.
+
+    Parameters:
+    - env (CastleEscapeEnv): Environment to train on.
+    - num_episodes (int): Number of episodes to run.
+    - gamma (float): Discount factor.
+    - epsilon (float): Initial exploration rate.
+    - decay_rate (float): Epsilon is decayed as epsilon = epsilon * decay_rate after each episode.
+    - seed (int): Seed for the epsilon-greedy action selection.
+    - q_table (QTable): Table to continue training, a new one is created when None.
+    - callback (callable): Called as callback(obs, reward, done, info) after every step, e.g. vis_gym.refresh.
+    - checkpoint_path (str): File to checkpoint to every checkpoint_every episodes and at the end.
+    - checkpoint_every (int): Number of episodes between checkpoints.
+    - resume_from (str): Checkpoint to continue from. Training picks up at the saved episode index with
+      the saved epsilon and generator states, so an interrupted run that is resumed ends with exactly
+      the same table as an uninterrupted one; num_episodes is the total including resumed episodes.
+    - planning_steps (int): Dyna mode: after every real step, apply up to this many simulated updates
+      from a DynaModel of the observed transitions, prioritized by Bellman error (0 disables planning).
+      The model is not part of checkpoints, so resume_from cannot be combined with planning.
+    - priority_threshold (float): Minimum Bellman error for a (s, a) pair to be queued for planning.
+
+    Returns:
+    - q_table (QTable): The trained Q-table.
+    """
+    num_actions = len(env.actions)
+    start_episode = 0
+    if resume_from is not None and planning_steps:
+        raise ValueError("resume_from cannot be used with planning_steps > 0: checkpoints do not include "
+                         "the Dyna model, so the resumed run would not match an uninterrupted one")
+    if resume_from is not None:
+        q_table, epsilon, start_episode, rng = load_checkpoint(resume_from, env)
+    else:
+        rng = np.random.default_rng(seed)
+        if q_table is None:
+            q_table = QTable(env.num_states, num_actions)
+        q_table.metadata.update(gamma=gamma, decay_rate=decay_rate, seed=seed)
+    q_table.metadata['episodes'] = num_episodes
+    values = q_table.values
+    model = DynaModel(env, gamma, priority_threshold) if planning_steps else None
+
+    for episode in range(start_episode, num_episodes):
+        if checkpoint_path is not None and episode > start_episode and episode % checkpoint_every == 0:
+            save_checkpoint(checkpoint_path, q_table, epsilon, episode, rng, env)
+        env.reset()
+        state = env.get_state_hash()
+        done = False
+        while not done:
+            if rng.random() < epsilon:
+                action = int(rng.integers(num_actions))
+            else:
+                action = int(values[state].argmax())
+            next_state, reward, done = env.step_fast(action)
+            q_table.update(state, action, reward, next_state, done, gamma)
+            if model is not None:
+                model.update(values, state, action, reward, next_state)
+                model.plan(values, planning_steps)
+            if callback is not None:
+                callback(*env.last_step_result())
+            state = next_state
+        epsilon *= decay_rate
+
+    if checkpoint_path is not None:
+        save_checkpoint(checkpoint_path, q_table, epsilon, num_episodes, rng, env)
+    return q_table
+
+
+def batched_q_learning(num_episodes=10000, num_envs=256, gamma=0.9, epsilon=1, decay_rate=0.999, seed=None,
+                       env=None, q_table=None):
+    """
+    Synchronous Q-learning over num_envs concurrent episodes of a CastleEscapeVecEnv.
+
+    Every iteration takes one epsilon-greedy step in all episodes and applies the eta = 1/(1+n) update
+    to the whole batch with NumPy scatter operations. All targets use the Q-values from before the
+    batch. Duplicate (s, a) pairs in a batch are handled exactly and order-independently, see
+    QTable.update_batch.
+    Epsilon is decayed once per finished episode.
+
+    Parameters:
+    - num_episodes (int): Number of episodes to finish, episodes still running at the end are dropped.
+    - num_envs (int): Number of concurrent episodes.
+    - gamma (float): Discount factor.
+    - epsilon (float): Initial exploration rate.
+    - decay_rate (float): Epsilon is decayed as epsilon = epsilon * decay_rate after each episode.
+    - seed (int): Seed for the action selection and the vectorized env.
+    - env (CastleEscapeEnv): Env providing the layout, the default castle when None.
+    - q_table (QTable): Table to continue training, a new one is created when None.
+
+    Returns:
+    - q_table (QTable): The trained Q-table.
+    """
+    from vec_env import CastleEscapeVecEnv
+
+    policy_seed, env_seed = np.random.SeedSequence(seed).spawn(2)
+    rng = np.random.default_rng(policy_seed)
+    vec_env = CastleEscapeVecEnv(num_envs, env=env, seed=env_seed)
+    num_states, num_actions = vec_env.num_states, vec_env.num_actions
+    if q_table is None:
+        q_table = QTable(num_states, num_actions)
+    q_table.metadata.update(gamma=gamma, decay_rate=decay_rate, seed=seed, episodes=num_episodes, num_envs=num_envs)
+
+    states = vec_env.reset()
+    finished = 0
+    while finished < num_episodes:
+        greedy = q_table.values[states].argmax(axis=1)
+        explore = rng.random(num_envs) < epsilon
+        actions = np.where(explore, rng.integers(num_actions, size=num_envs), greedy)
+        next_states, rewards, dones, _ = vec_env.step(actions)
+
+        targets = rewards + np.where(dones, 0.0, gamma * q_table.values[next_states].max(axis=1))
+        q_table.update_batch(states, actions, targets)
+
+        num_done = int(np.count_nonzero(dones))
+        finished += num_done
+        epsilon *= decay_rate ** num_done
+        states = next_states
+
+    return q_table
@@ -0,0 +1,92 @@
+import os
+import queue
+import threading
+import numpy as np
+
+
+class EpisodeRecorder:
+    """Collects rgb_array frames per episode and writes them to compressed .npz archives in a background thread"""
+
+    def __init__(self, directory, max_pending=16):
+        """
+        Parameters:
+        - directory (str): Output directory, one episode_XXXXXX.npz file is written per episode.
+        - max_pending (int): Maximum number of finished episodes waiting to be written before
+          end_episode() blocks, bounding memory use.
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.frames = []
+        self.episode = 0
+        self.errors = []
+        self.pending = queue.Queue(maxsize=max_pending)
+        self.writer = threading.Thread(target=self._write_loop, daemon=True)
+        self.writer.start()
+
+    def add_frame(self, frame):
+        """Appends one frame of the current episode"""
+        self.frames.append(frame)
+
+    def end_episode(self, **metadata):
+        """Hands the current episode to the writer thread, metadata is stored alongside the frames"""
+        path = os.path.join(self.directory, f'episode_{self.episode:06d}.npz')
+        self.pending.put((path, self.frames, metadata))
+        self.frames = []
+        self.episode += 1
+        return path
+
+    def _write_loop(self):
+        while True:
+            item = self.pending.get()
+            if item is None:
+                break
+            path, frames, metadata = item
+            try:
+                # np.savez_compressed releases the GIL while compressing, so rollouts keep running
+                np.savez_compressed(path, frames=np.stack(frames), **metadata)
+            except Exception as error:
+                self.errors.append((path, error))
+
+    def close(self):
+        """Writes all pending episodes and stops the writer thread"""
+        if self.frames:
+            self.end_episode()
+        self.pending.put(None)
+        self.writer.join()
+        if self.errors:
+            raise RuntimeError(f"Failed to write {len(self.errors)} episode(s): {self.errors[0]}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def record_episodes(env, policy, num_episodes, directory, max_steps=1000):
+    """
+    Plays episodes with a state -> action policy array and records every frame offscreen.
+
+    Returns:
+    - paths (list of str): The written episode archives.
+    """
+    paths = []
+    with EpisodeRecorder(directory) as recorder:
+        for _ in range(num_episodes):
+            env.reset()
+            recorder.add_frame(env.render(mode='rgb_array'))
+            total_reward, done, steps = 0, False, 0
+            while not done and steps < max_steps:
+                _, reward, done = env.step_fast(int(policy[env.get_state_hash()]))
+                recorder.add_frame(env.render(mode='rgb_array'))
+                total_reward += reward
+                steps += 1
+            paths.append(recorder.end_episode(total_reward=total_reward, steps=steps, done=done))
+    return paths
+
+
+def load_episode(path):
+    """Loads a recorded episode as (frames, metadata dict)"""
+    with np.load(path) as data:
+        metadata = {key: data[key].item() for key in data.files if key != 'frames'}
+        return data['frames'], metadata
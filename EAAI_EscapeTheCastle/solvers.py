@@ -0,0 +1,208 @@
+"""
+Planning solvers for the hashed Castle Escape state space.
+
+All solvers take a transition model P and reward model R as returned by
+CastleEscapeEnv.get_transition_model() or model_from_counts():
+
+    - P is either a dense (S, A, S) array or a scipy.sparse matrix of shape (S*A, S) with row s*A + a.
+    - R is a dense (S, A) array of expected immediate rewards.
+
+Each solver returns (policy, V, info) where policy[s] is the greedy action for hashed state s,
+V is the state value array and info is a dict with the Q-values, iteration count, convergence
+flag and per-sweep wall times.
+"""
+import time
+import numpy as np
+
+
+def _as_matrix(P, R):
+    """Returns P as an (S*A, S) matrix together with S and A"""
+    num_states, num_actions = R.shape
+    if isinstance(P, np.ndarray):
+        return P.reshape(num_states * num_actions, num_states), num_states, num_actions
+    return P.tocsr(), num_states, num_actions
+
+
+def q_values(P, R, V, gamma=0.9):
+    """Computes Q[s, a] = R[s, a] + gamma * sum_s' P[s, a, s'] V[s']"""
+    M, num_states, num_actions = _as_matrix(P, R)
+    return R + gamma * np.asarray(M @ V).reshape(num_states, num_actions)
+
+
+def policy_to_q_table(Q, num_actions=6):
+    """
+    Converts a Q array (S, A) or a policy array (S,) into the {state: {action: q}} dict used by MFMC.py.
+
+    A policy array is converted into a table where the chosen action has value 1 and all others 0,
+    so that max(Q_table[state], key=Q_table[state].get) returns the policy action.
+
+    Parameters:
+    - Q (numpy array): Q-values or policy.
+    - num_actions (int): Number of actions listed per state for a policy array, 6 for CastleEscapeEnv.
+    """
+    Q = np.asarray(Q)
+    if Q.ndim == 1:
+        table = np.zeros((len(Q), num_actions))
+        table[np.arange(len(Q)), Q] = 1.0
+        Q = table
+    return {s: dict(enumerate(row)) for s, row in enumerate(Q.tolist())}
+
+
+def model_from_counts(counts, reward_sums):
+    """
+    Estimates (P, R) from observed transition counts.
+
+    Parameters:
+    - counts: counts[s, a, s'] of observed transitions, as a dense (S, A, S) array or a scipy.sparse
+      matrix of shape (S*A, S) with row s*A + a.
+    - reward_sums (numpy array): Sum of rewards received for each (s, a).
+
+    Returns:
+    - P: Maximum likelihood transition probabilities, in the same format as counts. Unvisited (s, a)
+      pairs are self-loops.
+    - R (numpy array): Mean observed reward for each (s, a), 0 when unvisited.
+    """
+    num_states, num_actions = reward_sums.shape
+    if not isinstance(counts, np.ndarray):
+        from scipy.sparse import csr_matrix, diags
+        visits = np.asarray(counts.sum(axis=1)).ravel()
+        scale = np.divide(1.0, visits, out=np.zeros(len(visits)), where=visits > 0)
+        unvisited = np.flatnonzero(visits == 0)
+        self_loops = csr_matrix((np.ones(len(unvisited)), (unvisited, unvisited // num_actions)), shape=counts.shape)
+        P = (diags(scale) @ counts + self_loops).tocsr()
+        visits = visits.reshape(num_states, num_actions)
+        R = np.divide(reward_sums, visits, out=np.zeros((num_states, num_actions)), where=visits > 0)
+        return P, R
+
+    visits = counts.sum(axis=2)
+    P = np.divide(counts, visits[:, :, None], out=np.zeros(counts.shape), where=visits[:, :, None] > 0)
+    unvisited = np.nonzero(visits == 0)
+    P[unvisited[0], unvisited[1], unvisited[0]] = 1.0
+    R = np.divide(reward_sums, visits, out=np.zeros((num_states, num_actions)), where=visits > 0)
+    return P, R
+
+
+def _evaluate_policy(M, R, policy, gamma):
+    """Solves V = R_pi + gamma * P_pi V exactly for a fixed policy"""
+    num_states, num_actions = R.shape
+    rows = np.arange(num_states) * num_actions + policy
+    P_pi = M[rows]
+    R_pi = R[np.arange(num_states), policy]
+    if isinstance(P_pi, np.ndarray):
+        return np.linalg.solve(np.eye(num_states) - gamma * P_pi, R_pi)
+    from scipy.sparse import identity
+    from scipy.sparse.linalg import spsolve
+    return spsolve((identity(num_states, format='csc') - gamma * P_pi).tocsc(), R_pi)
+
+
+def value_iteration(P, R, gamma=0.9, tol=1e-6, max_iter=10000):
+    """
+    Value iteration with synchronous vectorized Bellman backups.
+
+    Parameters:
+    - P, R: Transition and reward model.
+    - gamma (float): Discount factor.
+    - tol (float): Stop once the largest value change in a sweep is below tol.
+    - max_iter (int): Maximum number of sweeps.
+
+    Returns:
+    - policy (numpy array), V (numpy array), info (dict)
+    """
+    M, num_states, num_actions = _as_matrix(P, R)
+    V = np.zeros(num_states)
+    sweep_times = []
+    converged = False
+
+    for _ in range(max_iter):
+        start = time.perf_counter()
+        Q = R + gamma * np.asarray(M @ V).reshape(num_states, num_actions)
+        V_new = Q.max(axis=1)
+        delta = np.abs(V_new - V).max()
+        V = V_new
+        sweep_times.append(time.perf_counter() - start)
+        if delta < tol:
+            converged = True
+            break
+
+    Q = R + gamma * np.asarray(M @ V).reshape(num_states, num_actions)
+    info = {'Q': Q, 'iterations': len(sweep_times), 'converged': converged, 'sweep_times': sweep_times}
+    return Q.argmax(axis=1), V, info
+
+
+def policy_iteration(P, R, gamma=0.9, tol=1e-6, max_iter=1000, policy=None):
+    """
+    Policy iteration with exact policy evaluation.
+
+    Parameters:
+    - P, R: Transition and reward model.
+    - gamma (float): Discount factor. Must be below 1 for the evaluation step to be well posed.
+    - tol (float): Minimum Q-value gain for switching a state's action.
+    - max_iter (int): Maximum number of improvement steps.
+    - policy (numpy array): Initial policy, all zeros by default.
+
+    Returns:
+    - policy (numpy array), V (numpy array), info (dict)
+    """
+    M, num_states, num_actions = _as_matrix(P, R)
+    policy = np.zeros(num_states, dtype=np.int64) if policy is None else np.asarray(policy, dtype=np.int64)
+    sweep_times = []
+    converged = False
+
+    for _ in range(max_iter):
+        start = time.perf_counter()
+        V = _evaluate_policy(M, R, policy, gamma)
+        Q = R + gamma * np.asarray(M @ V).reshape(num_states, num_actions)
+        # Keep the current action on (near) ties so the loop terminates
+        current = Q[np.arange(num_states), policy]
+        new_policy = np.where(Q.max(axis=1) > current + tol, Q.argmax(axis=1), policy)
+        sweep_times.append(time.perf_counter() - start)
+        if np.array_equal(new_policy, policy):
+            converged = True
+            break
+        policy = new_policy
+
+    info = {'Q': Q, 'iterations': len(sweep_times), 'converged': converged, 'sweep_times': sweep_times}
+    return policy, V, info
+
+
+def modified_policy_iteration(P, R, gamma=0.9, eval_sweeps=20, tol=1e-6, max_iter=10000):
+    """
+    Modified policy iteration: greedy improvement followed by eval_sweeps partial evaluation backups.
+
+    Parameters:
+    - P, R: Transition and reward model.
+    - gamma (float): Discount factor.
+    - eval_sweeps (int): Number of fixed-policy backups per iteration.
+    - tol (float): Stop once the largest value change of the improvement backup is below tol.
+    - max_iter (int): Maximum number of iterations.
+
+    Returns:
+    - policy (numpy array), V (numpy array), info (dict)
+    """
+    M, num_states, num_actions = _as_matrix(P, R)
+    states = np.arange(num_states)
+    V = np.zeros(num_states)
+    sweep_times = []
+    converged = False
+
+    for _ in range(max_iter):
+        start = time.perf_counter()
+        Q = R + gamma * np.asarray(M @ V).reshape(num_states, num_actions)
+        policy = Q.argmax(axis=1)
+        V_new = Q.max(axis=1)
+        delta = np.abs(V_new - V).max()
+        V = V_new
+        if delta < tol:
+            sweep_times.append(time.perf_counter() - start)
+            converged = True
+            break
+
+        P_pi = M[states * num_actions + policy]
+        R_pi = R[states, policy]
+        for _ in range(eval_sweeps):
+            V = R_pi + gamma * np.asarray(P_pi @ V)
+        sweep_times.append(time.perf_counter() - start)
+
+    Q = R + gamma * np.asarray(M @ V).reshape(num_states, num_actions)
+    info = {'Q': Q, 'iterations': len(sweep_times), 'converged': converged, 'sweep_times': sweep_times}
+    return Q.argmax(axis=1), V, info
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The game modules are flat scripts imported by name, as MBMC.py and MFMC.py do
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,12 @@
+import numpy as np
+from evaluation import evaluate_policy
+
+
+def test_blocked_player_counts_one_encounter():
+    # Move DOWN, and UP once a guard is in the room: the move is blocked, so the player stays stuck
+    # with the first guard met until the episode is truncated
+    policy = np.where(np.arange(375) % 5 > 0, 0, 1)
+    results = evaluate_policy(policy, num_episodes=200, num_envs=64, seed=0, max_steps=100)
+    assert results['truncation_rate'] == 1.0
+    encounters = sum(stats['encounters'] for stats in results['guards'].values())
+    assert 0 < encounters <= 200
@@ -0,0 +1,17 @@
+import numpy as np
+from parallel import run_rollouts
+from qlearning import QTable
+
+
+def test_rollouts_truncate_stuck_policy():
+    # All-zero Q-values play UP from the start room, which is out of bounds, forever
+    results = run_rollouts(4, num_workers=1, policy=QTable(375, 6).to_policy(), max_steps=50)
+    np.testing.assert_array_equal(results['lengths'], [50] * 4)
+    assert results['truncated'].all()
+    assert results['collector'].num_episodes == 0
+
+
+def test_rollouts_finished_episodes_are_not_truncated():
+    results = run_rollouts(20, num_workers=1, seed=1)
+    assert not results['truncated'].any()
+    assert results['collector'].num_episodes == 20
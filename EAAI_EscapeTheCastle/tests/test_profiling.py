@@ -0,0 +1,16 @@
+from mdp_gym import CastleEscapeEnv
+from profiling import EnvProfiler
+
+
+def test_reset_mid_episode_starts_a_new_length_count():
+    env = CastleEscapeEnv(seed=0)
+    with EnvProfiler(env) as profiler:
+        for _ in range(3):
+            env.step_fast(0)
+        env.reset()
+        steps, done = 0, False
+        while not done:
+            done = env.step_fast(int(env.action_space.sample()))[2]
+            steps += 1
+    assert dict(profiler.episode_lengths) == {steps: 1}
+    assert 'reset' not in env.__dict__ and '_step' not in env.__dict__
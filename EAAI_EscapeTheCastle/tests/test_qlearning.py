@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+from mdp_gym import CastleEscapeEnv
+from qlearning import QTable, batched_q_learning, q_learning
+
+
+class Interrupted(Exception):
+    pass
+
+
+@pytest.mark.parametrize('rng_block_size', [0, 64])
+def test_resumed_run_is_bit_identical(tmp_path, rng_block_size):
+    path = str(tmp_path / 'checkpoint.npz')
+    expected = q_learning(CastleEscapeEnv(seed=5, rng_block_size=rng_block_size), 120, seed=1)
+
+    finished = []
+
+    def interrupt(obs, reward, done, info):
+        finished.append(done)
+        if sum(finished) == 100:
+            raise Interrupted
+    with pytest.raises(Interrupted):
+        q_learning(CastleEscapeEnv(seed=5, rng_block_size=rng_block_size), 120, seed=1, callback=interrupt,
+                   checkpoint_path=path, checkpoint_every=40)
+
+    # The env seed is irrelevant, its generator state comes from the checkpoint
+    resumed = q_learning(CastleEscapeEnv(seed=99, rng_block_size=rng_block_size), 120, resume_from=path)
+    np.testing.assert_array_equal(resumed.values, expected.values)
+    np.testing.assert_array_equal(resumed.counts, expected.counts)
+
+
+def test_plain_table_cannot_be_resumed(tmp_path):
+    path = str(tmp_path / 'Q_table.npz')
+    QTable(375, 6).save(path)
+    with pytest.raises(ValueError, match='without training state'):
+        q_learning(CastleEscapeEnv(seed=0), 10, resume_from=path)
+
+
+def test_batch_update_matches_sequential_updates_in_any_order():
+    rng = np.random.default_rng(0)
+    start = QTable(4, 2)
+    start.values[:] = rng.normal(size=(4, 2))
+    start.counts[:] = rng.integers(0, 5, size=(4, 2))
+    # Many duplicate (s, a) pairs in one batch
+    states = rng.integers(4, size=50)
+    actions = rng.integers(2, size=50)
+    targets = rng.normal(size=50) * 100
+
+    batched = QTable(4, 2)
+    batched.values[:], batched.counts[:] = start.values, start.counts
+    batched.update_batch(states, actions, targets)
+
+    for order in [np.arange(50), np.arange(50)[::-1], rng.permutation(50)]:
+        sequential = QTable(4, 2)
+        sequential.values[:], sequential.counts[:] = start.values, start.counts
+        for i in order:
+            # done=True makes the target the given value, as the batch uses pre-batch targets
+            sequential.update(states[i], actions[i], targets[i], 0, True, 0.9)
+        np.testing.assert_allclose(batched.values, sequential.values, rtol=1e-12, atol=1e-9)
+        np.testing.assert_array_equal(batched.counts, sequential.counts)
+
+
+def test_batched_q_learning_is_deterministic():
+    first = batched_q_learning(300, num_envs=32, seed=3)
+    second = batched_q_learning(300, num_envs=32, seed=3)
+    np.testing.assert_array_equal(first.values, second.values)
+    np.testing.assert_array_equal(first.counts, second.counts)
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+from mdp_gym import CastleEscapeEnv
+from solvers import (modified_policy_iteration, policy_iteration, policy_to_q_table, q_values,
+                     value_iteration, _as_matrix, _evaluate_policy)
+
+GAMMA = 0.9
+
+
+@pytest.fixture(scope='module')
+def models():
+    env = CastleEscapeEnv()
+    P, R = env.get_transition_model()
+    P_sparse, _ = env.get_transition_model(sparse=True)
+    return {'dense': (P, R), 'sparse': (P_sparse, R)}
+
+
+@pytest.fixture(scope='module')
+def optimum(models):
+    policy, V, info = policy_iteration(*models['dense'], gamma=GAMMA)
+    assert info['converged']
+    return policy, V
+
+
+@pytest.mark.parametrize('fmt', ['dense', 'sparse'])
+@pytest.mark.parametrize('solver', [value_iteration, policy_iteration, modified_policy_iteration])
+def test_solvers_agree(models, optimum, fmt, solver):
+    P, R = models[fmt]
+    best_policy, best_V = optimum
+    policy, V, info = solver(P, R, gamma=GAMMA)
+    assert info['converged']
+    np.testing.assert_allclose(V, best_V, atol=1e-3)
+
+    # The greedy policy is optimal: its exact value is V*, and it only differs from the reference
+    # policy on (near) ties
+    M = _as_matrix(P, R)[0]
+    np.testing.assert_allclose(_evaluate_policy(M, R, policy, GAMMA), best_V, atol=1e-3)
+    Q = q_values(P, R, best_V, GAMMA)
+    gap = Q.max(axis=1) - Q[np.arange(len(Q)), policy]
+    assert (gap < 1e-3).all()
+    sorted_Q = np.sort(Q, axis=1)
+    clear = sorted_Q[:, -1] - sorted_Q[:, -2] > 1e-3
+    np.testing.assert_array_equal(policy[clear], best_policy[clear])
+
+
+def test_policy_to_q_table_lists_every_action():
+    table = policy_to_q_table(np.array([0, 3, 1]))
+    assert all(sorted(actions) == list(range(6)) for actions in table.values())
+    assert [max(actions, key=actions.get) for actions in table.values()] == [0, 3, 1]
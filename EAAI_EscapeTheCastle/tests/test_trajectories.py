@@ -0,0 +1,46 @@
+import os
+import numpy as np
+from mdp_gym import CastleEscapeEnv
+from trajectories import TRAJECTORY_COLUMNS, TrajectoryLog, TrajectoryWriter, record_trajectories
+
+
+def write_steps(directory, episodes):
+    with TrajectoryWriter(directory) as writer:
+        for i, episode in enumerate(episodes):
+            writer.append(episode, i, i % 6, float(i), i + 1, False)
+
+
+def test_writer_truncates_torn_tail(tmp_path):
+    directory = str(tmp_path)
+    write_steps(directory, [0, 0, 0])
+    # Torn write: 3 extra rows made it into one column only
+    with open(os.path.join(directory, 'episode.bin'), 'ab') as f:
+        f.write(np.array([9, 9, 9], dtype=TRAJECTORY_COLUMNS['episode']).tobytes())
+    assert len(TrajectoryLog(directory)) == 3
+
+    write_steps(directory, [1, 1])
+    log = TrajectoryLog(directory)
+    assert len(log) == 5
+    np.testing.assert_array_equal(log['episode'], [0, 0, 0, 1, 1])
+    np.testing.assert_array_equal(log['state'], [0, 1, 2, 0, 1])
+    for name, dtype in TRAJECTORY_COLUMNS.items():
+        assert os.path.getsize(os.path.join(directory, f'{name}.bin')) == 5 * dtype.itemsize
+
+
+def test_record_trajectories_truncates_stuck_policy(tmp_path):
+    # Action 0 plays UP from the start room, which is out of bounds, so the episodes never end
+    log = record_trajectories(CastleEscapeEnv(seed=0), str(tmp_path), num_episodes=3,
+                              policy=np.zeros(375, dtype=int), max_steps=20)
+    assert len(log) == 60
+    np.testing.assert_array_equal(log['episode'], np.repeat([0, 1, 2], 20))
+    assert not log['done'].any()
+    assert len(log.episode_bounds()[0]) == 0
+
+
+def test_episode_bounds_skip_truncated_episodes(tmp_path):
+    directory = str(tmp_path)
+    with TrajectoryWriter(directory) as writer:
+        writer.extend([0, 0, 1, 1, 1, 2, 2], np.arange(7), 0, 0.0, 1, [False, True, False, False, False, False, True])
+    starts, ends = TrajectoryLog(directory).episode_bounds()
+    np.testing.assert_array_equal(starts, [0, 5])
+    np.testing.assert_array_equal(ends, [2, 7])
@@ -0,0 +1,87 @@
+from collections import Counter
+import numpy as np
+import pytest
+from layout import CastleLayout
+from mdp_gym import CastleEscapeEnv, CastleState
+
+NUM_SAMPLES = 20000
+LAYOUTS = {
+    'default': None,
+    # (1, 0) is a wall next to the start room
+    'walled': CastleLayout.random(6, 6, wall_density=0.3, seed=6),
+}
+
+
+def assert_mean_reward(rewards, expected):
+    # Within 4 standard errors of the sample mean, and exact when every sample got the same reward
+    rewards = np.asarray(rewards)
+    assert abs(rewards.mean() - expected) <= 4 * rewards.std() / np.sqrt(len(rewards)) + 1e-9
+
+
+@pytest.fixture(scope='module', params=sorted(LAYOUTS))
+def model(request):
+    env = CastleEscapeEnv(layout=LAYOUTS[request.param])
+    P, R = env.get_transition_model()
+    return env, P, R
+
+
+def test_rows_sum_to_one(model):
+    _, P, _ = model
+    assert (P >= 0).all()
+    np.testing.assert_allclose(P.sum(axis=2), 1, atol=1e-12)
+
+
+def test_sparse_matches_dense(model):
+    env, P, R = model
+    P_sparse, R_sparse = env.get_transition_model(sparse=True)
+    num_states, num_actions = R.shape
+    assert P_sparse.shape == (num_states * num_actions, num_states)
+    np.testing.assert_allclose(P_sparse.toarray().reshape(P.shape), P, atol=1e-12)
+    np.testing.assert_allclose(R_sparse, R, atol=1e-12)
+
+
+@pytest.mark.parametrize('action', range(6))
+def test_first_step_matches_sampled_steps(model, action):
+    # Right after reset() the guards are uniformly placed, which is what the model marginalises over
+    env, P, R = model
+    env = CastleEscapeEnv(seed=0, layout=env.layout)
+    counts, rewards = Counter(), []
+    for _ in range(NUM_SAMPLES):
+        env.reset()
+        state = env.get_state_hash()
+        next_state, reward, _ = env.step_fast(action)
+        counts[next_state] += 1
+        rewards.append(reward)
+
+    sampled = np.zeros(P.shape[2])
+    sampled[list(counts)] = list(counts.values())
+    total_variation = np.abs(sampled / NUM_SAMPLES - P[state, action]).sum() / 2
+    assert total_variation < 0.02
+    assert_mean_reward(rewards, R[state, action])
+
+
+@pytest.mark.parametrize('health', [1, 2])
+@pytest.mark.parametrize('action', [4, 5])
+def test_fight_and_hide_match_sampled_steps(model, action, health):
+    # With a guard in the room the fight/hide outcome is exact, only the guard met in the room the
+    # player is pushed to is marginalised, so compare the (room, health) part of the next state
+    env, P, R = model
+    env = CastleEscapeEnv(seed=0, layout=env.layout)
+    guards = tuple(env.layout.guard_rooms[:len(env.guards)])
+    state = CastleState(guards[0], health, guards)
+    num_codes = len(env.guards) + 1
+    counts, rewards = Counter(), []
+    for _ in range(NUM_SAMPLES):
+        env.set_state(state)
+        next_state, reward, _ = env.step_fast(action)
+        counts[next_state // num_codes] += 1
+        rewards.append(reward)
+
+    env.set_state(state)
+    s = env.get_state_hash()
+    expected = P[s, action].reshape(-1, num_codes).sum(axis=1)
+    sampled = np.zeros(len(expected))
+    sampled[list(counts)] = list(counts.values())
+    total_variation = np.abs(sampled / NUM_SAMPLES - expected).sum() / 2
+    assert total_variation < 0.02
+    assert_mean_reward(rewards, R[s, action])
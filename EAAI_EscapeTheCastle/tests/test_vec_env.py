@@ -0,0 +1,65 @@
+from collections import Counter
+import numpy as np
+import pytest
+from mdp_gym import CastleEscapeEnv, CastleState
+from vec_env import CastleEscapeVecEnv
+
+GUARDS = ((1, 1), (2, 3), (3, 1), (4, 3))
+NUM_SAMPLES = 20000
+
+
+def scalar_outcomes(state, action, seed=0):
+    env = CastleEscapeEnv(seed=seed)
+    counts = Counter()
+    for _ in range(NUM_SAMPLES):
+        env.set_state(state)
+        next_state, reward, done = env.step_fast(action)
+        counts[next_state, reward, done] += 1
+    return counts
+
+
+def vec_outcomes(state, action, seed=0):
+    vec_env = CastleEscapeVecEnv(NUM_SAMPLES, seed=seed)
+    vec_env.set_state(state)
+    _, rewards, dones, info = vec_env.step(np.full(NUM_SAMPLES, action))
+    return Counter(zip(info['final_states'].tolist(), rewards.tolist(), dones.tolist()))
+
+
+@pytest.mark.parametrize('state, action', [
+    (CastleState((0, 0), 2, GUARDS), 1),  # Move with slips, no guard in the room
+    (CastleState((0, 2), 2, GUARDS), 0),  # Move out of bounds
+    (CastleState((1, 1), 2, GUARDS), 3),  # Move blocked by G1
+    (CastleState((1, 1), 1, GUARDS), 4),  # Fight G1
+    (CastleState((2, 3), 1, GUARDS), 5),  # Hide from G2, failed hides turn into fights
+    (CastleState((4, 3), 1, GUARDS), 4),  # Fight G4 next to the goal, may end in victory or defeat
+])
+def test_one_step_distribution_matches_scalar_env(state, action):
+    scalar = scalar_outcomes(state, action)
+    vec = vec_outcomes(state, action)
+    total_variation = sum(abs(scalar[key] - vec[key]) for key in set(scalar) | set(vec)) / (2 * NUM_SAMPLES)
+    assert total_variation < 0.03
+
+
+def test_finished_episodes_are_reset():
+    vec_env = CastleEscapeVecEnv(64, seed=0)
+    vec_env.set_state(CastleState((3, 4), 2, GUARDS))
+    states, rewards, dones, info = vec_env.step(np.full(64, 1))  # DOWN into the goal, unless slipping
+    assert dones.any()
+    assert (rewards[dones] == vec_env.rewards['goal']).all()
+    np.testing.assert_array_equal(vec_env.player[dones], vec_env.start_cell)
+    assert (states[dones] != info['final_states'][dones]).all()
+
+
+def test_reset_guard_rooms_match_scalar_env():
+    env = CastleEscapeEnv(seed=0)
+    scalar = Counter()
+    for _ in range(NUM_SAMPLES):
+        env.reset()
+        scalar.update(enumerate(env.guard_positions))
+    vec_env = CastleEscapeVecEnv(NUM_SAMPLES, seed=0)
+    rows = [tuple(divmod(cell, vec_env.cols) for cell in guards) for guards in vec_env.guard_positions.tolist()]
+    assert all(len(set(guards)) == vec_env.num_guards for guards in rows)
+    vec = Counter(pair for guards in rows for pair in enumerate(guards))
+    # Room distribution of each guard
+    total_variation = sum(abs(scalar[key] - vec[key]) for key in set(scalar) | set(vec)) / (2 * NUM_SAMPLES * 4)
+    assert total_variation < 0.03
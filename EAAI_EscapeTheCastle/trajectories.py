@@ -0,0 +1,212 @@
+import json
+import os
+import numpy as np
+
+
+# One fixed-width binary file per column, each a flat little-endian array
+TRAJECTORY_COLUMNS = {
+    'episode': np.dtype('<i8'),
+    'state': np.dtype('<i4'),
+    'action': np.dtype('<i1'),
+    'reward': np.dtype('<f8'),
+    'next_state': np.dtype('<i4'),
+    'done': np.dtype('?'),
+}
+
+
+class TrajectoryWriter:
+    """Appends (episode, state, action, reward, next_state, done) steps to columnar binary files in chunks"""
+
+    def __init__(self, directory, chunk_size=65536):
+        """
+        Parameters:
+        - directory (str): Output directory, an existing log is appended to.
+        - chunk_size (int): Number of steps buffered in memory before they are written out.
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.chunk_size = chunk_size
+        self.buffers = {name: np.empty(chunk_size, dtype=dtype) for name, dtype in TRAJECTORY_COLUMNS.items()}
+        self.buffered = 0
+        self.num_steps = TrajectoryLog.count_steps(directory)
+        # Drop the tail of a torn write (e.g. after a crash) so every column ends at the same step
+        for name, dtype in TRAJECTORY_COLUMNS.items():
+            path = os.path.join(directory, f'{name}.bin')
+            if os.path.exists(path) and os.path.getsize(path) > self.num_steps * dtype.itemsize:
+                os.truncate(path, self.num_steps * dtype.itemsize)
+        self.files = {
+            name: open(os.path.join(directory, f'{name}.bin'), 'ab') for name in TRAJECTORY_COLUMNS
+        }
+        with open(os.path.join(directory, 'columns.json'), 'w') as f:
+            json.dump({name: dtype.str for name, dtype in TRAJECTORY_COLUMNS.items()}, f)
+
+    def append(self, episode, state, action, reward, next_state, done):
+        """Buffers one step"""
+        i = self.buffered
+        buffers = self.buffers
+        buffers['episode'][i] = episode
+        buffers['state'][i] = state
+        buffers['action'][i] = action
+        buffers['reward'][i] = reward
+        buffers['next_state'][i] = next_state
+        buffers['done'][i] = done
+        self.buffered = i + 1
+        if self.buffered == self.chunk_size:
+            self.flush()
+
+    def extend(self, episode, state, action, reward, next_state, done):
+        """Writes a batch of steps given as equal-length arrays, e.g. one CastleEscapeVecEnv step"""
+        self.flush()
+        columns = dict(episode=episode, state=state, action=action, reward=reward, next_state=next_state, done=done)
+        length = len(np.atleast_1d(state))
+        for name, dtype in TRAJECTORY_COLUMNS.items():
+            column = np.broadcast_to(np.asarray(columns[name], dtype=dtype), (length,))
+            self.files[name].write(np.ascontiguousarray(column).tobytes())
+        self.num_steps += length
+
+    def flush(self):
+        """Writes the buffered steps to disk"""
+        if self.buffered == 0:
+            return
+        for name, buffer in self.buffers.items():
+            self.files[name].write(buffer[:self.buffered].tobytes())
+            self.files[name].flush()
+        self.num_steps += self.buffered
+        self.buffered = 0
+
+    def close(self):
+        """Flushes and closes the column files"""
+        self.flush()
+        for f in self.files.values():
+            f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class TrajectoryLog:
+    """Memory-mapped, read-only view of a trajectory log written by TrajectoryWriter"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.num_steps = self.count_steps(directory)
+        # Zero-copy column arrays, pages are only read from disk when accessed
+        self.columns = {
+            name: self._map(name, dtype) for name, dtype in TRAJECTORY_COLUMNS.items()
+        }
+
+    @staticmethod
+    def count_steps(directory):
+        """Number of complete steps in the log, 0 when it does not exist yet"""
+        counts = []
+        for name, dtype in TRAJECTORY_COLUMNS.items():
+            path = os.path.join(directory, f'{name}.bin')
+            counts.append(os.path.getsize(path) // dtype.itemsize if os.path.exists(path) else 0)
+        # A partially written chunk (e.g. after a crash) is ignored, and cut off by the next TrajectoryWriter
+        return min(counts)
+
+    def _map(self, name, dtype):
+        if self.num_steps == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(os.path.join(self.directory, f'{name}.bin'), dtype=dtype, mode='r', shape=(self.num_steps,))
+
+    def __len__(self):
+        return self.num_steps
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def episode_bounds(self):
+        """Returns (starts, ends) step indices of every complete episode, skipping truncated ones"""
+        done, episode = self.columns['done'], self.columns['episode']
+        if self.num_steps == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        # An episode ends at a done step or, when it was truncated, where the episode id changes
+        ends = np.flatnonzero(done | np.append(episode[1:] != episode[:-1], True)) + 1
+        starts = np.concatenate(([0], ends[:-1]))
+        complete = done[ends - 1]
+        return starts[complete], ends[complete]
+
+    def chunks(self, chunk_size=1 << 20):
+        """Yields dicts of column slices of at most chunk_size steps"""
+        for start in range(0, self.num_steps, chunk_size):
+            yield {name: column[start:start + chunk_size] for name, column in self.columns.items()}
+
+    def fill_collector(self, collector, chunk_size=1 << 20):
+        """
+        Adds every logged step to a TransitionCollector, chunk by chunk, to re-estimate the model offline.
+
+        Returns:
+        - collector (TransitionCollector): The updated collector.
+        """
+        num_states, num_actions = collector.num_states, collector.num_actions
+        for chunk in self.chunks(chunk_size):
+            state = chunk['state'].astype(np.int64)
+            action = chunk['action'].astype(np.int64)
+            next_state = chunk['next_state'].astype(np.int64)
+            keys, counts = np.unique((state * num_actions + action) * num_states + next_state, return_counts=True)
+            transition_counts = collector.transition_counts
+            for key, count in zip(keys.tolist(), counts.tolist()):
+                transition_counts[key] = transition_counts.get(key, 0) + count
+            np.add.at(collector.reward_sums, (state, action), chunk['reward'])
+            collector.num_steps += len(state)
+            collector.num_episodes += int(np.count_nonzero(chunk['done']))
+
+            # Fight outcomes: a lost fight always costs one health level
+            health, guard = collector.decode(state)
+            fought = (action == collector.fight_action) & (guard > 0)
+            won = fought & (collector.decode(next_state)[0] == health)
+            collector.fights += np.bincount(guard[fought] - 1, minlength=collector.num_guards)
+            collector.wins += np.bincount(guard[won] - 1, minlength=collector.num_guards)
+        return collector
+
+    def replay(self, q_table, gamma=0.9, chunk_size=1 << 20):
+        """
+        Re-runs Q-learning updates over the logged steps in order.
+
+        Returns:
+        - q_table (QTable): The updated table.
+        """
+        for chunk in self.chunks(chunk_size):
+            steps = zip(chunk['state'].tolist(), chunk['action'].tolist(), chunk['reward'].tolist(),
+                        chunk['next_state'].tolist(), chunk['done'].tolist())
+            for state, action, reward, next_state, done in steps:
+                q_table.update(state, action, reward, next_state, done, gamma)
+        return q_table
+
+
+def record_trajectories(env, directory, num_episodes=1000, policy=None, seed=None, first_episode=0, max_steps=1000):
+    """
+    Plays episodes on a CastleEscapeEnv and appends every step to a trajectory log.
+
+    Episodes still running after max_steps steps are cut off; their last step is logged with done=False.
+
+    Parameters:
+    - env (CastleEscapeEnv): Environment to play on.
+    - directory (str): Log directory.
+    - num_episodes (int): Number of episodes to play.
+    - policy (numpy array): Action for each hashed state, uniformly random actions when None.
+    - seed (int): Seed for the random actions.
+    - first_episode (int): Episode id of the first episode.
+    - max_steps (int): Step limit per episode.
+
+    Returns:
+    - log (TrajectoryLog): Memory-mapped view of the updated log.
+    """
+    rng = np.random.default_rng(seed)
+    num_actions = len(env.actions)
+    with TrajectoryWriter(directory) as writer:
+        for episode in range(first_episode, first_episode + num_episodes):
+            env.reset()
+            state = env.get_state_hash()
+            done, steps = False, 0
+            while not done and steps < max_steps:
+                action = int(rng.integers(num_actions)) if policy is None else int(policy[state])
+                next_state, reward, done = env.step_fast(action)
+                writer.append(episode, state, action, reward, next_state, done)
+                state = next_state
+                steps += 1
+    return TrajectoryLog(directory)
@@ -0,0 +1,219 @@
+import numpy as np
+from mdp_gym import CastleEscapeEnv
+
+
+class CastleEscapeVecEnv:
+    """Runs num_envs CastleEscapeEnv episodes in lockstep, holding their state in NumPy arrays"""
+
+    def __init__(self, num_envs, env=None, seed=None):
+        # The scalar env is only used as the source of the game parameters
+        self.env = env if env is not None else CastleEscapeEnv()
+        self.num_envs = num_envs
+        self.rng = np.random.default_rng(seed)
+
+        self.layout = self.env.layout
+        self.rows, self.cols = self.layout.rows, self.layout.cols
+        self.num_cells = self.layout.num_cells
+        self.start_cell = self.cell_index(self.layout.start)
+        self.goal_cell = self.cell_index(self.layout.goal)
+        self.num_guards = len(self.env.guard_names)
+        self.num_health = len(self.env.health_states)
+        self.num_actions = len(self.env.actions)
+        # Same encoding as hash() in MBMC.py/MFMC.py: x*(5*3*5) + y*(3*5) + h*5 + g
+        self.num_states = self.num_cells * self.num_health * (self.num_guards + 1)
+        self.full_health = self.env.health_state_to_int['Full']
+        self.rewards = self.env.rewards
+
+        # Guard parameters indexed by guard_in_cell (0 = no guard in the room)
+        self.strength = np.zeros(self.num_guards + 1)
+        self.keenness = np.zeros(self.num_guards + 1)
+        for i, guard in enumerate(self.env.guard_names):
+            self.strength[i + 1] = self.env.guards[guard]['strength']
+            self.keenness[i + 1] = self.env.guards[guard]['keenness']
+
+        # Guards are placed in random rooms (not the start, the goal or walls)
+        self.guard_rooms = np.array([self.cell_index(room) for room in self.layout.guard_rooms])
+
+        self._build_move_tables()
+
+        self.player = np.zeros(num_envs, dtype=np.int64)
+        self.health = np.zeros(num_envs, dtype=np.int64)
+        self.guard_positions = np.zeros((num_envs, self.num_guards), dtype=np.int64)
+        # Guard rooms are sampled num_envs episodes at a time and handed out as episodes reset
+        self._room_pool = np.empty((0, self.num_guards), dtype=np.int64)
+        self.reset()
+
+    def cell_index(self, position):
+        """Maps a (row, col) room to its flat cell index"""
+        return position[0] * self.cols + position[1]
+
+    def _build_move_tables(self):
+        """Precomputes intended moves, slip targets and adjacent rooms for every cell"""
+        # Direction order matches CastleEscapeEnv.actions: UP, DOWN, LEFT, RIGHT
+        offsets = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+        open_rooms = self.layout.open_rooms
+
+        self._move_target = np.full((self.num_cells, 4), -1, dtype=np.int64)
+        self._slip_targets = np.zeros((self.num_cells, 4, 3), dtype=np.int64)
+        self._slip_count = np.zeros((self.num_cells, 4), dtype=np.int64)
+        self._adjacent = np.zeros((self.num_cells, 4), dtype=np.int64)
+        self._adjacent_count = np.zeros(self.num_cells, dtype=np.int64)
+
+        for x, y in self.layout.rooms:
+            cell = self.cell_index((x, y))
+            targets = [(x + dx, y + dy) for dx, dy in offsets]
+            in_bounds = [target in open_rooms for target in targets]
+            adjacent = [self.cell_index(target) for target, ok in zip(targets, in_bounds) if ok]
+            self._adjacent[cell, :len(adjacent)] = adjacent
+            self._adjacent_count[cell] = len(adjacent)
+            for a in range(4):
+                if in_bounds[a]:
+                    self._move_target[cell, a] = self.cell_index(targets[a])
+                slips = [
+                    self.cell_index(target) for b, target in enumerate(targets)
+                    if b != a and in_bounds[b]
+                ]
+                self._slip_targets[cell, a, :len(slips)] = slips
+                self._slip_count[cell, a] = len(slips)
+
+    def reset(self, seed=None):
+        """Resets every episode and returns the hashed initial states"""
+        if seed is not None:
+            self.rng = np.random.default_rng(seed)
+            self._room_pool = self._room_pool[:0]
+        self._reset_envs(np.arange(self.num_envs))
+        return self.get_states()
+
+    def _reset_envs(self, envs):
+        """Resets the given episodes to the initial configuration"""
+        if len(envs) == 0:
+            return
+        self.player[envs] = self.start_cell
+        self.health[envs] = self.full_health
+
+        if len(self._room_pool) < len(envs):
+            self._room_pool = np.concatenate((self._room_pool, self._sample_rooms(max(len(envs), self.num_envs))))
+        self.guard_positions[envs] = self.guard_rooms[self._room_pool[:len(envs)]]
+        self._room_pool = self._room_pool[len(envs):]
+
+    def _sample_rooms(self, n):
+        """
+        Draws num_guards distinct guard room indices for each of n episodes, uniformly and in random order.
+
+        Guard k picks a rank r among the rooms not taken by guards 0..k-1, which is turned into a room
+        index by stepping over the taken rooms in increasing order, so the cost does not grow with the
+        number of rooms.
+        """
+        picks = np.empty((n, self.num_guards), dtype=np.int64)
+        for k in range(self.num_guards):
+            rank = self.rng.integers(len(self.guard_rooms) - k, size=n)
+            for taken in np.sort(picks[:, :k], axis=1).T:
+                rank += taken <= rank
+            picks[:, k] = rank
+        return picks
+
+    def truncate(self, envs):
+        """Resets the given episodes early, e.g. when they hit a step limit"""
+        self._reset_envs(np.asarray(envs, dtype=np.int64))
+
+    def set_state(self, state, envs=None):
+        """Puts the given episodes (all by default) into the CastleState of a scalar env"""
+        envs = np.arange(self.num_envs) if envs is None else np.asarray(envs, dtype=np.int64)
+        self.player[envs] = self.cell_index(state.player_position)
+        self.health[envs] = state.player_health
+        self.guard_positions[envs] = [self.cell_index(room) for room in state.guard_positions]
+
+    def guards_in_cell(self):
+        """Returns the guard_in_cell index (0 = none) for every episode"""
+        guard = np.zeros(self.num_envs, dtype=np.int64)
+        # Guards are in distinct rooms, so at most one of them matches
+        for i, rooms in enumerate(self.guard_positions.T, start=1):
+            guard[rooms == self.player] = i
+        return guard
+
+    def get_states(self):
+        """Returns the hashed state of every episode"""
+        guard = self.guards_in_cell()
+        return (self.player * self.num_health + self.health) * (self.num_guards + 1) + guard
+
+    def get_observations(self):
+        """Returns the observations of every episode as a dict of arrays"""
+        return {
+            'player_position': np.stack(np.divmod(self.player, self.cols), axis=1),
+            'player_health': self.health.copy(),
+            'guard_in_cell': self.guards_in_cell(),
+        }
+
+    def step(self, actions):
+        """
+        Performs one step in every episode.
+
+        Parameters:
+        - actions (array of int): One action per episode.
+
+        Returns:
+        - states (numpy array): Hashed next states, already reset for finished episodes.
+        - rewards (numpy array): Reward of each episode for this step.
+        - dones (numpy array): Whether each episode reached a terminal state.
+        - info (dict): 'final_states' holds the hashed next states before the auto-reset.
+        """
+        actions = np.asarray(actions, dtype=np.int64)
+        player = self.player
+        guard = self.guards_in_cell()
+        has_guard = guard > 0
+        rewards = np.zeros(self.num_envs)
+
+        # u[0] is the move/fight/hide roll, u[1] the fight roll after a failed hide,
+        # u[2] picks among the candidate rooms
+        u = self.rng.random((3, self.num_envs))
+        new_player = player.copy()
+
+        # Movement (blocked while a guard is in the room, no-op when out of bounds)
+        direction = np.minimum(actions, 3)
+        target = self._move_target[player, direction]
+        moving = (actions < 4) & ~has_guard & (target >= 0)
+        new_player[moving] = target[moving]
+
+        # 10% chance to move to a random adjacent cell other than the intended one
+        slipping = moving & (u[0] > 0.9)
+        slip_count = self._slip_count[player, direction]
+        slip_choice = (u[2] * slip_count).astype(np.int64)
+        slip_to = self._slip_targets[player, direction, np.minimum(slip_choice, 2)]
+        new_player = np.where(slipping & (slip_count > 0), slip_to, new_player)
+        new_player = np.where(slipping & (slip_count == 0), player, new_player)
+
+        # Hiding succeeds when the roll beats the guard's keenness, otherwise the player must fight
+        hiding = (actions == 5) & has_guard
+        hid = hiding & (u[0] > self.keenness[guard])
+        fighting = ((actions == 4) & has_guard) | (hiding & ~hid)
+        fight_roll = np.where(hiding, u[1], u[0])
+        won = fighting & (fight_roll > self.strength[guard])
+        lost = fighting & ~won
+        rewards[won] += self.rewards['combat_win']
+        rewards[lost] += self.rewards['combat_loss']
+        self.health = np.where(lost, np.maximum(self.health - 1, 0), self.health)
+
+        # After hiding or fighting the player is moved to a random adjacent cell
+        relocating = hid | fighting
+        adjacent_count = self._adjacent_count[player]
+        adjacent_choice = np.minimum((u[2] * adjacent_count).astype(np.int64), 3)
+        adjacent_to = self._adjacent[player, adjacent_choice]
+        new_player = np.where(relocating & (adjacent_count > 0), adjacent_to, new_player)
+        self.player = new_player
+
+        # Reaching the goal takes precedence over defeat, as in CastleEscapeEnv.is_terminal
+        goal = self.player == self.goal_cell
+        defeat = ~goal & (self.health == 0)
+        rewards[goal] += self.rewards['goal']
+        rewards[defeat] += self.rewards['defeat']
+        dones = goal | defeat
+
+        final_states = self.get_states()
+        self._reset_envs(np.flatnonzero(dones))
+        states = self.get_states() if dones.any() else final_states
+
+        return states, rewards, dones, {'final_states': final_states}
+
+    def close(self):
+        """Performs cleanup"""
+        self.env.close()
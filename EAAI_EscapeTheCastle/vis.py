@@ -6,9 +6,12 @@ from mdp import CastleEscapeMDP  # Import the CastleEscapeMDP class
 # Initialize Pygame
 pygame.init()
 
-# Constants
-WIDTH, HEIGHT = 600, 840  # 5x5 grid, each room is 120x120 pixels
-GRID_SIZE = 5
+# Initialize MDP game
+game = CastleEscapeMDP()
+
+# Constants (grid sized from the game's layout, 5x5 by default with 120x120 pixel rooms)
+WIDTH, HEIGHT = 600, 840
+GRID_SIZE = game.grid_size
 CELL_SIZE = WIDTH // GRID_SIZE
 
 # Colors
@@ -30,9 +33,6 @@ IMGFILEPATH = {
 screen = pygame.display.set_mode((WIDTH, HEIGHT))
 pygame.display.set_caption("Castle Escape MDP Visualization")
 
-# Initialize MDP game
-game = CastleEscapeMDP()
-
 # Map room to grid cell positions
 def position_to_grid(position):
     row, col = position
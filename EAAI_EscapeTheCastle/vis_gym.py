@@ -1,13 +1,29 @@
-import pygame
 import sys
 import time
 import random
 from mdp_gym import CastleEscapeEnv  # Import the CastleEscapeMDP class
 
+# pygame is only imported once the GUI is used (setup(GUI=True), refresh or main), so headless
+# training scripts doing `from vis_gym import *` never load a display library. The import time is
+# tracked by the vis_gym_import entry of benchmark.py.
+pygame = None
 
-WIDTH, HEIGHT = 600, 840  # 5x5 grid, each room is 120x120 pixels
-GRID_SIZE = 5
-CELL_SIZE = WIDTH // GRID_SIZE
+def load_pygame():
+    """Imports pygame on first use"""
+    global pygame
+    if pygame is None:
+        import pygame as pygame_module
+        pygame = pygame_module
+    return pygame
+
+# Initialize MDP game
+game = CastleEscapeEnv()
+
+# The grid is sized from the game's layout (5x5 by default, each room is 120x120 pixels)
+GRID_SIZE = game.grid_size
+CELL_SIZE = 600 // GRID_SIZE
+GRID_WIDTH, GRID_HEIGHT = game.cols * CELL_SIZE, game.rows * CELL_SIZE
+WIDTH, HEIGHT = 600, GRID_HEIGHT + 240  # Console area below the grid
 
 # Colors
 WHITE = (255, 255, 255)
@@ -18,6 +34,7 @@ BLUE = (0, 0, 255)
 GRAY = (200, 200, 200)
 DARK_GRAY = (50, 50, 50)
 YELLOW = (255, 255, 0)  # Color for the goal room
+WALL_GRAY = (90, 90, 90)  # Color for walls
 
 ## Please add the file paths and use them to render some cool looking stuff.
 IMGFILEPATH = {
@@ -30,22 +47,50 @@ screen=None
 game_ended = False
 action_results = [None, None, None, None, None]
 
+# Frame budget for refresh(): at most fps frames per second (0 = unlimited) and only every
+# frame_skip-th call is drawn. Steps in between only update the console log, and terminal
+# steps are always drawn. sleeptime adds a pause after each drawn frame for slow viewing.
 fps = 60
-sleeptime = 0.1
-clock = None
-
-# Initialize MDP game
-game = CastleEscapeEnv()
+frame_skip = 1
+sleeptime = 0
+
+# Rendering caches: fonts, rendered text, the static background and the last frame's dirty rects
+fonts = {}
+text_cache = {}
+background = None
+last_dirty = []
+last_frame_time = 0.0
+refresh_count = 0
+
+def set_frame_budget(max_fps=60, skip=1, pause=0):
+    """Configures how often refresh() actually draws a frame"""
+    global fps, frame_skip, sleeptime
+    fps, frame_skip, sleeptime = max_fps, skip, pause
 
 # Initialize Pygame
 def setup(GUI=True):
     global screen
     if GUI:
+        load_pygame()
         pygame.init()
         screen = pygame.display.set_mode((WIDTH, HEIGHT))
         pygame.display.set_caption("Castle Escape MDP Visualization")
         # Constants
 
+# Cached fonts and text surfaces
+def get_font(size):
+    if size not in fonts:
+        fonts[size] = pygame.font.Font(None, size)
+    return fonts[size]
+
+def render_text(text, size, color):
+    key = (text, size, color)
+    if key not in text_cache:
+        if len(text_cache) > 256:  # Console lines are mostly unique, keep the cache bounded
+            text_cache.clear()
+        text_cache[key] = get_font(size).render(text, True, color)
+    return text_cache[key]
+
 # Map room to grid cell positions
 def position_to_grid(position):
     row, col = position
@@ -53,13 +98,18 @@ def position_to_grid(position):
 
 # Draw the grid for the rooms and shade console area
 def draw_grid():
-    for x in range(0, WIDTH, CELL_SIZE):
-        for y in range(0, 600, CELL_SIZE):
+    for x in range(0, GRID_WIDTH, CELL_SIZE):
+        for y in range(0, GRID_HEIGHT, CELL_SIZE):
             rect = pygame.Rect(x, y, CELL_SIZE, CELL_SIZE)
             pygame.draw.rect(screen, BLACK, rect, 1)
 
+    # Walls
+    for wall in game.layout.walls:
+        x, y = position_to_grid(wall)
+        pygame.draw.rect(screen, WALL_GRAY, pygame.Rect(x, y, CELL_SIZE, CELL_SIZE))
+
     # Shade
-    rect = pygame.Rect(0, 600, WIDTH, HEIGHT - 600)
+    rect = pygame.Rect(0, GRID_HEIGHT, WIDTH, HEIGHT - GRID_HEIGHT)
     pygame.draw.rect(screen, GRAY, rect)
 
 # Draw the goal room in yellow
@@ -67,8 +117,7 @@ def draw_goal_room():
     x, y = position_to_grid(game.goal_room)
     rect = pygame.Rect(x, y, CELL_SIZE-2, CELL_SIZE-2)
     pygame.draw.rect(screen, YELLOW, rect)
-    font = pygame.font.Font(None, 36)
-    label = font.render('Goal', True, BLACK)
+    label = render_text('Goal', 36, BLACK)
     screen.blit(label, (x + CELL_SIZE // 4 +1, y + CELL_SIZE // 4 +1))
 
 # Draw player at a given position
@@ -85,14 +134,14 @@ def draw_guards(guard_positions):
         rect = pygame.Rect(x + CELL_SIZE // 4, y + CELL_SIZE // 4, CELL_SIZE // 2, CELL_SIZE // 2)
         pygame.draw.rect(screen, RED, rect)
         # Label the guard
-        font = pygame.font.Font(None, 24)
-        label = font.render(guard, True, WHITE)
+        label = render_text(guard, 24, WHITE)
         screen.blit(label, (x + CELL_SIZE // 4, y + CELL_SIZE // 4))
 
 # Draw player and guard together if they are in the same room
 def draw_player_and_guard_together(position, guard_positions):
-    guards_in_room = [guard for guard, pos in guard_positions.items() if pos == position]
-    guards_not_in_room = [guard for guard in guard_positions if guard not in guards_in_room]
+    guard_in_room = game.guard_at.get(position)
+    guards_in_room = [guard_in_room] if guard_in_room else []
+    guards_not_in_room = [guard for guard in guard_positions if guard != guard_in_room]
     if guards_in_room:
         x, y = position_to_grid(position)
         # Draw the player
@@ -106,8 +155,7 @@ def draw_player_and_guard_together(position, guard_positions):
         pygame.draw.rect(screen, RED, (guard_x - CELL_SIZE // 8, guard_y - CELL_SIZE // 8, CELL_SIZE // 4, CELL_SIZE // 4))
         
         # Label the guard
-        font = pygame.font.Font(None, 24)
-        label = font.render(guards_in_room[0], True, WHITE)
+        label = render_text(guards_in_room[0], 24, WHITE)
         screen.blit(label, (guard_x - 10, guard_y - 10))
 
     for guard in guards_not_in_room:
@@ -115,21 +163,82 @@ def draw_player_and_guard_together(position, guard_positions):
 
 # Draw player health status
 def draw_health(health):
-    font = pygame.font.Font(None, 36)
-    health_text = f"Health: {health}"
-    health_surface = font.render(health_text, True, BLUE)
+    health_surface = render_text(f"Health: {health}", 36, BLUE)
     screen.blit(health_surface, (10, HEIGHT - 40))
 
 # Display victory or defeat message
 def display_end_message(message):
-    font = pygame.font.Font(None, 100)
-    text_surface = font.render(message, True, DARK_GRAY)
+    text_surface = render_text(message, 100, DARK_GRAY)
     text_rect = text_surface.get_rect(center=(WIDTH // 2, HEIGHT // 2))
     screen.blit(text_surface, text_rect)
+    return text_rect
+
+# Pre-render the static parts of the screen (grid, walls, console shade and goal room) once
+def get_background():
+    global background, screen
+    if background is None:
+        target = screen
+        background = pygame.Surface((WIDTH, HEIGHT))
+        screen = background
+        screen.fill(WHITE)
+        draw_grid()
+        draw_goal_room()
+        screen = target
+    return background
+
+# Print the latest results in the console area
+def draw_console(results):
+    screen.blit(render_text("Console", 30, BLUE), (10, GRID_HEIGHT + 10))
+    y_offset = GRID_HEIGHT + 45
+    for result in results:
+        if result is not None:
+            screen.blit(render_text(result, 24, BLACK), (10, y_offset))
+        y_offset += 30
+
+# Draw the changing parts of the frame over the cached background, updating only dirty rects
+def draw_frame():
+    global last_dirty, game_ended
+    full_redraw = not last_dirty
+    bg = get_background()
+
+    # Rooms holding the player or a guard, and the console, are the only areas that change
+    rooms = {game.player_position, *game.guard_positions}
+    dirty = [pygame.Rect(*position_to_grid(room), CELL_SIZE, CELL_SIZE) for room in rooms]
+    dirty.append(pygame.Rect(0, GRID_HEIGHT, WIDTH, HEIGHT - GRID_HEIGHT))
+    if full_redraw:
+        screen.blit(bg, (0, 0))
+    else:
+        for rect in last_dirty + dirty:
+            screen.blit(bg, rect, rect)
+
+    # Check if player and a guard are in the same room and draw them together
+    state = game.current_state
+    if game.guard_in_room():
+        draw_player_and_guard_together(state['player_position'], state['guard_positions'])
+    else:
+        # Draw the player and guards in separate positions
+        draw_player(state['player_position'])
+        draw_guards(state['guard_positions'])
+
+    # Display player health and the console
+    draw_health(state['player_health'])
+    draw_console(action_results)
+
+    terminal_state = game.is_terminal()
+    game_ended = bool(terminal_state)
+    if terminal_state:
+        dirty.append(display_end_message("Victory!" if terminal_state == 'goal' else "Defeat!"))
+
+    if full_redraw:
+        pygame.display.flip()
+    else:
+        pygame.display.update(last_dirty + dirty)
+    last_dirty = dirty
 
 # Main loop
 def main():
     global game_ended, action_results
+    load_pygame()
     clock = pygame.time.Clock()
     running = True
     end_message = ""
@@ -170,7 +279,7 @@ def main():
         draw_goal_room()
 
         # Check if player and a guard are in the same room and draw them together
-        if game.current_state['player_position'] in game.current_state['guard_positions'].values():
+        if game.guard_in_room():
             draw_player_and_guard_together(game.current_state['player_position'], game.current_state['guard_positions'])
         else:
             # Draw the player and guards in separate positions
@@ -192,15 +301,7 @@ def main():
             display_end_message(end_message)
 
         # Print the latest 5 results on the screen
-        font = pygame.font.Font(None, 30)
-        console_surface = font.render("Console", True, BLUE)
-        screen.blit(console_surface, (10, 610))
-        font = pygame.font.Font(None, 24)
-        y_offset = 645
-        for result in action_results[-5:]:
-            result_surface = font.render(result, True, BLACK)
-            screen.blit(result_surface, (10, y_offset))
-            y_offset += 30
+        draw_console(action_results[-5:])
 
         pygame.display.flip()
         clock.tick(30)
@@ -209,8 +310,12 @@ def main():
     sys.exit()
 
 def refresh(obs, reward, done, info, delay=0.1):
-    global fps, sleeptime, game_ended, clock, action_results
-    
+    global last_frame_time, refresh_count
+    load_pygame()
+
+    if not isinstance(obs, dict):  # Flat (hashed) observation
+        obs = game.decode_state(obs)
+
     try:
         action = info['action']
     except:
@@ -224,51 +329,19 @@ def refresh(obs, reward, done, info, delay=0.1):
         action_results.pop(0)
         action_results.append(result)
 
-    fps = 60
-    clock = pygame.time.Clock()
-    screen.fill(WHITE)
-    draw_grid()
-
-    # Draw the goal room
-    draw_goal_room()
-
-    # Check if player and a guard are in the same room and draw them together
-    if game.current_state['player_position'] in game.current_state['guard_positions'].values():
-        draw_player_and_guard_together(game.current_state['player_position'], game.current_state['guard_positions'])
-    else:
-        # Draw the player and guards in separate positions
-        draw_player(game.current_state['player_position'])
-        draw_guards(game.current_state['guard_positions'])
-
-    # Display player health
-    draw_health(game.current_state['player_health'])
-
-    if game.is_terminal() == 'goal':
-        game_ended = True
-        end_message = "Victory!"
-    elif game.is_terminal() == 'defeat':
-        game_ended = True
-        end_message = "Defeat!"
-
-    if game_ended:
-        display_end_message(end_message)
-
-    # Print the latest 5 results on the screen
-    font = pygame.font.Font(None, 30)
-    console_surface = font.render("Console", True, BLUE)
-    screen.blit(console_surface, (10, 610))
-    font = pygame.font.Font(None, 24)
-    y_offset = 645
-    for result in action_results:
-        result_surface = font.render(result, True, BLACK)
-        screen.blit(result_surface, (10, y_offset))
-        y_offset += 30
+    # Skip frames that exceed the frame budget, the console log above still records the step
+    refresh_count += 1
+    now = time.perf_counter()
+    if not done and (refresh_count % frame_skip or (fps and now - last_frame_time < 1.0 / fps)):
+        return
+    last_frame_time = now
 
-    # Check for terminal state
-    pygame.display.flip()
-    clock.tick(fps)
-    time.sleep(sleeptime)
+    pygame.event.pump()  # Keep the window responsive
+    draw_frame()
+    if sleeptime:
+        time.sleep(sleeptime)
 
 
 if __name__ == "__main__":
+    setup(GUI=True)
     main()
\ No newline at end of file